@@ -1,34 +1,50 @@
 # Standard library imports
-from typing import Dict
+from typing import Any, Callable, Dict
 
 # Third-party imports
 from fastapi import APIRouter, Request, Body, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Local imports
 from schemas import AuthCredentials
-from utils import hash_password, verify_password, generate_avatar, session_users
+from utils import hash_password, verify_and_rehash, generate_avatar, hashing_pool, HasherBusy
 from models_orm import User
-from database import get_db
+from database import get_async_db
+from sessions import session_store
+from profiling import span
 
 auth_router = APIRouter()
 
+async def _hash_in_pool(fn: Callable[..., Any], *args: Any) -> Any:
+    try:
+        with span("hash"):
+            return await hashing_pool.run(fn, *args)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again.", headers={"Retry-After": "1"})
+
 @auth_router.post("/signup")
 async def signup(request: Request,
                  credentials: AuthCredentials = Body(...),
-                 db: Session = Depends(get_db)):
+                 db: AsyncSession = Depends(get_async_db)):
     username = credentials.username
     password = credentials.password
 
-    existing = db.query(User).filter(User.username == username).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Username already exists.")
-    new_user = User(username=username, password_hash=hash_password(password))
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # One round trip: the unique index on username decides, so concurrent signups can't both win.
+    password_hash = await _hash_in_pool(hash_password, password)
+    with span("db"):
+        user_id = (await db.execute(
+            insert(User)
+            .values(username=username, password_hash=password_hash)
+            .on_conflict_do_nothing(index_elements=[User.username])
+            .returning(User.id)
+        )).scalar_one_or_none()
+        if user_id is None:
+            raise HTTPException(status_code=400, detail="Username already exists.")
+        await db.commit()
 
-    session_users[request.state.session_id] = username
+    await session_store.set(request.state.session_id, "user", username)
 
     return {
         "message": "User registered successfully.",
@@ -40,17 +56,27 @@ async def signup(request: Request,
 @auth_router.post("/login")
 async def login(request: Request,
                 credentials: AuthCredentials = Body(...),
-                db: Session = Depends(get_db)):
+                db: AsyncSession = Depends(get_async_db)):
     username = credentials.username
     password = credentials.password
 
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
+    with span("db"):
+        user = (await db.execute(
+            select(User.id, User.password_hash).where(User.username == username)
+        )).one_or_none()
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid username or password.")
+    valid, new_hash = await _hash_in_pool(verify_and_rehash, password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password.")
+    if new_hash:
+        with span("db"):
+            await db.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
+            await db.commit()
 
-    session_users[request.state.session_id] = username
+    await session_store.set(request.state.session_id, "user", username)
     return {
-        "message": f"User logged in successfully.",
+        "message": "User logged in successfully.",
         "username": username,
         "avatar": generate_avatar(username),
         "logged_in": True
@@ -59,5 +85,5 @@ async def login(request: Request,
 @auth_router.post("/logout")
 async def logout(request: Request) -> Dict[str, str]:
     session_id = request.state.session_id
-    session_users.pop(session_id, None)
+    await session_store.discard(session_id, "user")
     return {"message": "User logged out successfully."}
\ No newline at end of file
@@ -0,0 +1,91 @@
+# Compares map_concept_links' automaton-based matcher with the previous substring scan.
+# Run from the backend directory: `python benchmarks/bench_concept_links.py --paragraphs 1000 --concepts 500`
+
+# Standard library imports
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from matcher import ConceptMatcher
+
+WORDS = [
+    "loop", "array", "pointer", "class", "object", "method", "function", "recursion", "stack", "queue",
+    "tree", "graph", "hash", "table", "list", "string", "integer", "variable", "scope", "closure",
+    "iterator", "generator", "exception", "thread", "process", "lock", "mutex", "socket", "file", "buffer",
+    "sort", "search", "binary", "linear", "dynamic", "static", "type", "interface", "module", "package",
+]
+FILLER = "the a of and to in is that for it as with on this by are be can we you at from or an".split()
+
+def legacy_map_concept_links(text: str, concepts: list[str]) -> dict[str, dict[str, int]]:
+    concept_links = defaultdict(lambda: defaultdict(int))
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    for paragraph in paragraphs:
+        found = [c for c in concepts if c.lower() in paragraph.lower()]
+        for a, b in itertools.combinations(set(found), 2):
+            concept_links[a][b] += 1
+            concept_links[b][a] += 1
+    return {k: dict(v) for k, v in concept_links.items()}
+
+def matcher_map_concept_links(text: str, concepts: list[str]) -> dict[str, dict[str, int]]:
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    return ConceptMatcher(concepts).links(paragraphs)
+
+def make_inputs(n_paragraphs: int, n_concepts: int, words_per_paragraph: int, seed: int) -> tuple[str, list[str]]:
+    rng = random.Random(seed)
+    concepts = set()
+    while len(concepts) < n_concepts:
+        concepts.add(" ".join(rng.sample(WORDS, rng.choice((1, 2, 2, 3)))))
+    concepts = sorted(concepts)
+    paragraphs = []
+    for _ in range(n_paragraphs):
+        words = [rng.choice(FILLER) for _ in range(words_per_paragraph)]
+        for _ in range(rng.randint(0, 6)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(concepts))
+        paragraphs.append(" ".join(words).capitalize() + ".")
+    return "\n\n".join(paragraphs), concepts
+
+def best_of(fn, repeat: int) -> tuple[float, dict]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=1000)
+    parser.add_argument("--concepts", type=int, default=500)
+    parser.add_argument("--words", type=int, default=60, help="filler words per paragraph")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    text, concepts = make_inputs(args.paragraphs, args.concepts, args.words, args.seed)
+    legacy_s, legacy = best_of(lambda: legacy_map_concept_links(text, concepts), args.repeat)
+    matcher_s, links = best_of(lambda: matcher_map_concept_links(text, concepts), args.repeat)
+    build_s, _ = best_of(lambda: ConceptMatcher(concepts), args.repeat)
+
+    print(json.dumps({
+        "paragraphs": args.paragraphs,
+        "concepts": len(concepts),
+        "chars": len(text),
+        "legacy_seconds": round(legacy_s, 4),
+        "matcher_seconds": round(matcher_s, 4),
+        "matcher_build_seconds": round(build_s, 4),
+        "speedup": round(legacy_s / matcher_s, 1),
+        "legacy_edges": sum(len(v) for v in legacy.values()) // 2,
+        "matcher_edges": sum(len(v) for v in links.values()) // 2,
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+# Measures PDF parsing throughput of the document parser pool against the number of worker processes.
+# Run from the backend directory (reads .env like the app):
+# `python benchmarks/bench_document_parsing.py --pages 400 --workers 1 2 4`
+# Pass `--pdf path/to/course.pdf` to use a real document instead of a generated one.
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Third-party imports
+import pymupdf
+
+# Local imports
+from config import settings
+from parsing import MIME_PDF, DocumentParser
+
+PARAGRAPH = (
+    "A for loop repeats a block of code for every element of an array, while recursion solves a problem "
+    "by calling the same function on a smaller input until it reaches the base case. "
+)
+
+def make_pdf(path: str, pages: int) -> None:
+    with pymupdf.open() as document:
+        for number in range(pages):
+            page = document.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), f"Page {number}\n\n" + PARAGRAPH * 12, fontsize=10)
+        document.save(path)
+
+async def measure(path: str, workers: int, pages_per_task: int, rounds: int) -> dict:
+    parser = DocumentParser(workers, pages_per_task, settings.PARSER_TASK_TIMEOUT_SECONDS,
+                            settings.PARSER_WORKER_MEMORY_MB * 1024 * 1024, settings.PARSER_MAX_TASKS_PER_CHILD)
+    await parser.parse(path, MIME_PDF)  # start the worker processes outside the measurement
+    parser.busy_seconds = 0.0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        pages, _ = await parser.parse(path, MIME_PDF)
+    elapsed = time.perf_counter() - started
+    parser.shutdown()
+    return {
+        "workers": workers,
+        "pages_per_task": pages_per_task,
+        "pages": len(pages) * rounds,
+        "seconds": round(elapsed, 2),
+        "pages_per_second": round(len(pages) * rounds / elapsed, 1),
+        "pages_per_core_second": round(len(pages) * rounds / parser.busy_seconds, 1),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", help="existing PDF to parse instead of a generated one")
+    parser.add_argument("--pages", type=int, default=400, help="pages of the generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, settings.parser_workers])
+    parser.add_argument("--pages-per-task", type=int, default=settings.PARSER_PAGES_PER_TASK)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if path is None:
+            path = os.path.join(tmp, "bench.pdf")
+            make_pdf(path, args.pages)
+        results = [asyncio.run(measure(path, w, args.pages_per_task, args.rounds)) for w in dict.fromkeys(args.workers)]
+    print(json.dumps({"cpu_count": os.cpu_count(), "results": results}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+# Measures login throughput of the Argon2 hashing pool with the configured hasher parameters.
+# Run from the backend directory (reads .env like the app):
+# `python benchmarks/bench_password_hashing.py --workers 1 2 4 --seconds 5`
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from config import settings
+from utils import HashingPool, hash_password, verify_and_rehash
+
+async def measure(workers: int, concurrency: int, seconds: float, hashed: str) -> dict:
+    pool = HashingPool(workers, queue_depth=concurrency)
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client() -> None:
+        nonlocal done
+        while time.perf_counter() < deadline:
+            valid, _ = await pool.run(verify_and_rehash, "correct horse battery staple", hashed)
+            assert valid
+            done += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    rate = done / elapsed
+    return {
+        "workers": workers,
+        "logins": done,
+        "seconds": round(elapsed, 2),
+        "logins_per_second": round(rate, 1),
+        "logins_per_second_per_core": round(rate / min(workers, os.cpu_count() or 1), 1),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, settings.password_hash_workers])
+    parser.add_argument("--concurrency", type=int, default=32, help="simultaneous logins")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    hashed = hash_password("correct horse battery staple")
+    results = [asyncio.run(measure(w, args.concurrency, args.seconds, hashed)) for w in dict.fromkeys(args.workers)]
+    print(json.dumps({
+        "argon2": {
+            "time_cost": settings.ARGON2_TIME_COST,
+            "memory_cost_kib": settings.ARGON2_MEMORY_COST,
+            "parallelism": settings.ARGON2_PARALLELISM,
+        },
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+# Measures JSON encoding time (json vs orjson) and bytes on the wire (raw, gzip, brotli) for session
+# concept payloads of growing size, like the ones /progress, /concept-graph and upload jobs return.
+# Run from the backend directory: `python benchmarks/bench_responses.py --concepts 100 1000 5000`
+
+# Standard library imports
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Third-party imports
+import orjson
+
+# Local imports
+from compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+
+WORDS = ("recursion", "pointer", "array", "loop", "class", "inheritance", "closure", "hash", "map", "tree",
+         "graph", "stack", "queue", "exception", "iterator", "generator", "lambda", "template", "thread", "mutex")
+
+def session_concepts(count: int, rng: random.Random) -> dict:
+    files = [f"curs_{n:02d}.pdf" for n in range(12)]
+    return {
+        f"{rng.choice(WORDS)} {rng.choice(WORDS)} {n}": {
+            "complexity": rng.choice(("unknown", "basic", "intermediate", "advanced")),
+            "understanding": rng.randint(0, 1),
+            "files": rng.sample(files, rng.randint(1, 3)),
+        }
+        for n in range(count)
+    }
+
+def best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def measure(count: int, repeat: int) -> dict:
+    payload = {"concepts": session_concepts(count, random.Random(count))}
+    body = orjson.dumps(payload)
+    result = {
+        "concepts": count,
+        "json_encode_ms": round(best_time(lambda: json.dumps(payload, ensure_ascii=False).encode(), repeat) * 1000, 3),
+        "orjson_encode_ms": round(best_time(lambda: orjson.dumps(payload), repeat) * 1000, 3),
+        "raw_bytes": len(body),
+    }
+    gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    result["gzip_bytes"] = len(gzip.compress(body) + gzip.flush())
+    result["gzip_ms"] = round(best_time(lambda: zlib.compress(body, GZIP_LEVEL), repeat) * 1000, 3)
+    if brotli is not None:
+        result["brotli_bytes"] = len(brotli.compress(body, quality=BROTLI_QUALITY))
+        result["brotli_ms"] = round(best_time(lambda: brotli.compress(body, quality=BROTLI_QUALITY), repeat) * 1000, 3)
+    return result
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concepts", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps({
+        "gzip_level": GZIP_LEVEL,
+        "brotli_quality": BROTLI_QUALITY if brotli is not None else None,
+        "results": [measure(count, args.repeat) for count in args.concepts],
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+# Measures worker cold start: how long `import main` takes in a fresh interpreter, which modules
+# dominate it, and the time from launching uvicorn to the first answered request.
+# Run from the backend directory (reads .env like the app, needs the database):
+# `python benchmarks/bench_startup.py --runs 5`
+
+# Standard library imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import() -> tuple[float, list[tuple[str, float]]]:
+    # -X importtime prints "import time: self [us] | cumulative | name" for every module to stderr.
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=BACKEND, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules.append((name.rstrip(), int(cumulative) / 1e6))
+    total = next(seconds for name, seconds in modules if name.strip() == "main")
+    # Direct imports of main (indented by three spaces) are the ones worth making lazy.
+    top = sorted((m for m in modules if m[0].startswith("   ") and not m[0].startswith("    ")),
+                 key=lambda m: m[1], reverse=True)
+    return total, [(name.strip(), seconds) for name, seconds in top[:10]]
+
+def measure_first_request(port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=BACKEND)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1.0) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"no answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def summary(samples: list[float]) -> dict:
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    imports, slowest = [], []
+    for _ in range(args.runs):
+        seconds, slowest = measure_import()
+        imports.append(seconds)
+    first_requests = [measure_first_request(args.port, args.timeout) for _ in range(args.runs)]
+    print(json.dumps({
+        "runs": args.runs,
+        "import_main": summary(imports),
+        "first_request": summary(first_requests),
+        "slowest_direct_imports_ms": {name: round(seconds * 1000, 1) for name, seconds in slowest},
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+# Offline evaluation of relevance-ranked prompt packing for concept extraction. For every document of
+# benchmarks/data/concept_extraction_eval.json it compares what each extraction mode would send upstream,
+# with and without packing: number of calls, prompt tokens, and concept recall (the share of expected
+# concepts that appear in the text sent, an upper bound on what the model can return). No API calls.
+# Run from the backend directory (reads .env like the app):
+# `python benchmarks/eval_concept_packing.py --chunk-tokens 250 500 1000`
+
+# Standard library imports
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+import packing
+from concepts import MAX_CONTENT_LENGTH, split_into_chunks
+from config import settings
+from matcher import ConceptMatcher
+from packing import count_tokens, pack, pack_chunks
+
+EVAL_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "concept_extraction_eval.json")
+
+def evaluate(texts: list[str], concepts: list[str]) -> dict:
+    matcher = ConceptMatcher(concepts)
+    found = set().union(*(matcher.find(text) for text in texts)) if texts else set()
+    return {
+        "calls": len(texts),
+        "prompt_tokens": sum(count_tokens(text) for text in texts),
+        "recall": round(len(found) / len(concepts), 3),
+    }
+
+def evaluate_document(document: dict, chunk_tokens: int) -> dict:
+    pages, concepts = document["pages"], document["concepts"]
+    return {
+        "truncate": evaluate(["\n\n".join(pages)[:MAX_CONTENT_LENGTH]], concepts),
+        "truncate_packed": evaluate([pack(pages, chunk_tokens)], concepts),
+        "chunked": evaluate(split_into_chunks(pages, settings.EXTRACTION_CHUNK_CHARS), concepts),
+        "chunked_packed": evaluate(pack_chunks(pages, chunk_tokens, settings.EXTRACTION_MAX_CHUNKS), concepts),
+    }
+
+def totals(results: list[dict]) -> dict:
+    summary = {}
+    for mode in results[0]:
+        rows = [result[mode] for result in results]
+        summary[mode] = {
+            "calls": sum(row["calls"] for row in rows),
+            "prompt_tokens": sum(row["prompt_tokens"] for row in rows),
+            "mean_recall": round(sum(row["recall"] for row in rows) / len(rows), 3),
+        }
+    return summary
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval-set", default=EVAL_SET)
+    parser.add_argument("--chunk-tokens", type=int, nargs="+", default=[settings.EXTRACTION_CHUNK_TOKENS])
+    args = parser.parse_args()
+    with open(args.eval_set, encoding="utf-8") as f:
+        documents = json.load(f)["documents"]
+
+    runs = []
+    for chunk_tokens in args.chunk_tokens:
+        results = [evaluate_document(document, chunk_tokens) for document in documents]
+        runs.append({
+            "chunk_tokens": chunk_tokens,
+            "totals": totals(results),
+            "documents": {document["name"]: result for document, result in zip(documents, results)},
+        })
+    print(json.dumps({
+        "token_counter": "tiktoken" if packing._get_encoding() is not None else "estimate",
+        "chunk_chars": settings.EXTRACTION_CHUNK_CHARS,
+        "runs": runs,
+    }, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+# Local stand-in for the OpenAI chat completions API, used by the load test.
+# Answers POST /v1/chat/completions (plain and streamed) after a configurable
+# latency, emits tokens at a configurable rate and fails a configurable share of
+# requests. Run: `python benchmarks/loadtest/fake_openai.py --port 8099 --latency 0.5`
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+# Third-party imports
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+WORDS = (
+    "write a function that takes list of numbers and returns the sum use loop variable "
+    "print result check edge cases empty input index value iterate over each element"
+).split()
+
+STREAM_TICK_SECONDS = 0.05
+
+class FakeOpenAI:
+    def __init__(self, latency: float, jitter: float, tokens_per_second: float,
+                 completion_tokens: int, error_rate: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    def completion_text(self, prompt: str) -> list[str]:
+        # Exercise prompts get the "Exercise:/Hint:" layout the backend parses; anything else gets prose.
+        words = [self.random.choice(WORDS) for _ in range(max(2, self.completion_tokens))]
+        if "Hint:" in prompt:
+            half = len(words) // 2
+            return ["Exercise:\n"] + [f"{w} " for w in words[:half]] + ["\n\nHint:\n"] + [f"{w} " for w in words[half:]]
+        return [f"{w} " for w in words]
+
+    async def chat_completions(self, request: Request) -> Response:
+        body = await request.json()
+        self.requests += 1
+        prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+                status_code=500,
+            )
+
+        tokens = self.completion_text(prompt)
+        usage = {
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(tokens),
+            "total_tokens": len(prompt.split()) + len(tokens),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def chunk(choices: list, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            per_tick = max(1, int(self.tokens_per_second * STREAM_TICK_SECONDS))
+            for start in range(0, len(tokens), per_tick):
+                text = "".join(tokens[start:start + per_tick])
+                yield chunk([{"index": 0, "delta": {"content": text}, "finish_reason": None}])
+                await asyncio.sleep(per_tick / self.tokens_per_second)
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                yield chunk([], usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def stats(self, _request: Request) -> Response:
+        return JSONResponse({"requests": self.requests, "errors": self.errors})
+
+def create_app(fake: FakeOpenAI) -> Starlette:
+    return Starlette(routes=[
+        Route("/v1/chat/completions", fake.chat_completions, methods=["POST"]),
+        Route("/stats", fake.stats, methods=["GET"]),
+    ])
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.1, help="uniform +/- seconds added to the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.latency, args.jitter, args.tokens_per_second,
+                      args.completion_tokens, args.error_rate, args.seed)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
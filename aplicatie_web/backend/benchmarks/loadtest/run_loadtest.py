@@ -0,0 +1,332 @@
+# Load test for the backend: starts the fake OpenAI server and `uvicorn main:app`
+# pointed at it, then drives virtual users through a weighted mix of routes and
+# prints throughput and latency percentiles per route as JSON.
+# The backend reads DATABASE_URL from the environment or the backend .env; use a
+# scratch database, since every virtual user signs up a new account. With more
+# than one worker it also holds the sessions (SESSION_BACKEND=database).
+# Run from the backend directory:
+# `python benchmarks/loadtest/run_loadtest.py --concurrency 50 --duration 60 --output results.json`
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# Third-party imports
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FAKE_OPENAI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_openai.py")
+
+DEFAULT_MIX = "generate_exercise=4,check_solution=2,progress=3,mark=1,login=1"
+OPERATIONS = ("generate_exercise", "check_solution", "progress", "mark", "login", "root")
+CONCEPT_WORDS = (
+    "loops", "arrays", "pointers", "recursion", "classes", "closures", "generators", "exceptions",
+    "sorting", "hashing", "queues", "stacks", "trees", "graphs", "strings", "threads",
+)
+
+@dataclass
+class Sample:
+    route: str
+    status: int
+    seconds: float
+    started: float
+
+@dataclass
+class VirtualUser:
+    client: httpx.AsyncClient
+    username: str
+    password: str
+    exercises: dict[str, str] = field(default_factory=dict)
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}', expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    # Nearest-rank percentile.
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(samples: list[Sample], seconds: float) -> dict[str, Any]:
+    by_route: dict[str, list[Sample]] = {}
+    for sample in samples:
+        by_route.setdefault(sample.route, []).append(sample)
+    routes = {}
+    for route, route_samples in sorted(by_route.items()):
+        latencies = sorted(s.seconds for s in route_samples)
+        statuses: dict[str, int] = {}
+        for s in route_samples:
+            statuses[str(s.status)] = statuses.get(str(s.status), 0) + 1
+        routes[route] = {
+            "requests": len(route_samples),
+            "errors": sum(1 for s in route_samples if s.status == 0 or s.status >= 400),
+            "statuses": statuses,
+            "throughput_rps": round(len(route_samples) / seconds, 2),
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 1),
+                "p50": round(percentile(latencies, 50) * 1000, 1),
+                "p95": round(percentile(latencies, 95) * 1000, 1),
+                "p99": round(percentile(latencies, 99) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1),
+            },
+        }
+    return {
+        "requests": len(samples),
+        "errors": sum(r["errors"] for r in routes.values()),
+        "throughput_rps": round(len(samples) / seconds, 2),
+        "routes": routes,
+    }
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.samples: list[Sample] = []
+        self.concepts = [f"{CONCEPT_WORDS[i % len(CONCEPT_WORDS)]} {i}" for i in range(args.concepts)]
+        self.operations = list(args.mix)
+        self.weights = list(args.mix.values())
+        self.measure_from = 0.0
+        self.deadline = 0.0
+
+    async def request(self, user: VirtualUser, route: str, method: str, path: str,
+                      payload: Optional[dict] = None, stream: bool = False) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            if stream:
+                async with user.client.stream(method, path, json=payload) as response:
+                    await response.aread()
+            else:
+                response = await user.client.request(method, path, json=payload)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        if started >= self.measure_from:
+            self.samples.append(Sample(route, status, time.perf_counter() - started, started))
+        return response
+
+    async def signup(self, user: VirtualUser) -> None:
+        # Argon2 is deliberately slow; a 503 from a saturated hashing pool is retried after Retry-After.
+        credentials = {"username": user.username, "password": user.password}
+        while time.perf_counter() < self.deadline:
+            response = await self.request(user, "POST /signup", "POST", "/signup", credentials)
+            if response is not None and response.status_code != 503:
+                return
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)) if response is not None else 1)
+
+    async def generate_exercise(self, user: VirtualUser) -> None:
+        concept = self.random.choice(self.concepts)
+        stream = self.random.random() < self.args.stream_share
+        route = "POST /generate-exercise" + (" (stream)" if stream else "")
+        response = await self.request(user, route, "POST", "/generate-exercise",
+                                      {"concept": concept, "stream": stream}, stream=stream)
+        if response is None or response.status_code != 200:
+            return
+        if stream:
+            for line in response.text.splitlines():
+                if line.startswith("data:") and '"exercise"' in line and '"hint"' in line:
+                    user.exercises[concept] = json.loads(line[5:])["exercise"]
+        else:
+            user.exercises[concept] = response.json()["exercise"]
+
+    async def check_solution(self, user: VirtualUser) -> None:
+        if not user.exercises:
+            await self.generate_exercise(user)
+            return
+        concept, exercise = self.random.choice(list(user.exercises.items()))
+        stream = self.random.random() < self.args.stream_share
+        route = "POST /check-solution" + (" (stream)" if stream else "")
+        await self.request(user, route, "POST", "/check-solution", {
+            "concept": concept,
+            "exercise": exercise,
+            "solution": "def solve(values):\n    return sum(values)\n",
+            "stream": stream,
+        }, stream=stream)
+
+    async def mark(self, user: VirtualUser) -> None:
+        if not user.exercises:
+            await self.generate_exercise(user)
+            return
+        concept = self.random.choice(list(user.exercises))
+        await self.request(user, "POST /mark", "POST", "/mark", {"concept": concept})
+
+    async def progress(self, user: VirtualUser) -> None:
+        await self.request(user, "GET /progress", "GET", "/progress")
+
+    async def root(self, user: VirtualUser) -> None:
+        await self.request(user, "GET /", "GET", "/")
+
+    async def login(self, user: VirtualUser) -> None:
+        await self.request(user, "POST /login", "POST", "/login",
+                           {"username": user.username, "password": user.password})
+
+    async def virtual_user(self, base_url: str) -> None:
+        async with httpx.AsyncClient(base_url=base_url, timeout=self.args.timeout) as client:
+            user = VirtualUser(client, f"lt_{uuid.uuid4().hex[:16]}", uuid.uuid4().hex)
+            await self.signup(user)
+            while time.perf_counter() < self.deadline:
+                operation = self.random.choices(self.operations, self.weights)[0]
+                await getattr(self, operation)(user)
+                if self.args.think_time:
+                    await asyncio.sleep(self.random.expovariate(1 / self.args.think_time))
+
+    async def run(self, base_url: str) -> dict[str, Any]:
+        started = time.perf_counter()
+        self.measure_from = started + self.args.warmup
+        self.deadline = self.measure_from + self.args.duration
+        await asyncio.gather(*(self.virtual_user(base_url) for _ in range(self.args.concurrency)))
+        measured = max(1e-9, min(time.perf_counter(), self.deadline) - self.measure_from)
+        return summarize(self.samples, measured)
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} was not ready after {timeout} seconds")
+
+def stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--stream-share", type=float, default=0.0,
+                        help="share of exercise/solution requests sent with stream=true")
+    parser.add_argument("--concepts", type=int, default=100, help="distinct concepts requested")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a user's requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+
+    server = parser.add_argument_group("backend")
+    server.add_argument("--target", help="URL of an already running backend; skips starting both servers")
+    server.add_argument("--port", type=int, default=8181)
+    server.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    server.add_argument("--database-url", help="DATABASE_URL for the backend (default: environment or .env)")
+
+    fake = parser.add_argument_group("fake OpenAI server")
+    fake.add_argument("--openai-port", type=int, default=8099)
+    fake.add_argument("--latency", type=float, default=0.5)
+    fake.add_argument("--jitter", type=float, default=0.1)
+    fake.add_argument("--tokens-per-second", type=float, default=50.0)
+    fake.add_argument("--completion-tokens", type=int, default=60)
+    fake.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        if args.target:
+            base_url = args.target.rstrip("/")
+        else:
+            openai_url = f"http://127.0.0.1:{args.openai_port}"
+            processes.append(subprocess.Popen([
+                sys.executable, FAKE_OPENAI,
+                "--port", str(args.openai_port),
+                "--latency", str(args.latency),
+                "--jitter", str(args.jitter),
+                "--tokens-per-second", str(args.tokens_per_second),
+                "--completion-tokens", str(args.completion_tokens),
+                "--error-rate", str(args.error_rate),
+                "--seed", str(args.seed),
+            ]))
+            wait_until_ready(f"{openai_url}/stats", processes[-1], timeout=30)
+
+            env = {**os.environ, "OPENAI_BASE_URL": f"{openai_url}/v1"}
+            env.setdefault("OPENAI_API_KEY", "sk-loadtest")
+            if args.database_url:
+                env["DATABASE_URL"] = args.database_url
+            # Uvicorn doesn't tell the app how many workers it started; as in launch.py, the
+            # workers split the OpenAI rate limits and must share sessions and upload jobs.
+            env["WEB_CONCURRENCY"] = str(args.workers)
+            if args.workers > 1:
+                env["SESSION_BACKEND"] = "database"
+            base_url = f"http://127.0.0.1:{args.port}"
+            processes.append(subprocess.Popen([
+                sys.executable, "-m", "uvicorn", "main:app",
+                "--port", str(args.port),
+                "--workers", str(args.workers),
+                "--log-level", "warning",
+            ], cwd=BACKEND_DIR, env=env))
+            wait_until_ready(f"{base_url}/", processes[-1], timeout=60)
+
+        results = asyncio.run(LoadTest(args).run(base_url))
+        if not args.target:
+            results["fake_openai"] = httpx.get(f"{openai_url}/stats", timeout=5).json()
+    finally:
+        for process in reversed(processes):
+            stop(process)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": args.mix,
+            "stream_share": args.stream_share,
+            "concepts": args.concepts,
+            "think_time": args.think_time,
+            "workers": None if args.target else args.workers,
+            "openai": None if args.target else {
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "tokens_per_second": args.tokens_per_second,
+                "completion_tokens": args.completion_tokens,
+                "error_rate": args.error_rate,
+            },
+        },
+        **results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+# Standard library imports
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Local imports
+from config import settings
+
+__all__ = [
+    "ExerciseCache",
+    "exercise_cache",
+]
+
+logger = logging.getLogger(__name__)
+
+Variant = Tuple[str, str]  # (exercise, hint)
+
+# LRU + TTL cache of exercise/hint pairs. A key only counts as a hit once it holds
+# `variants` fresh pairs; until then callers generate a new pair and `put` it, so
+# popular concepts still get some variety. With `db_path` set, pairs are mirrored
+# to SQLite and reloaded on a memory miss, so the cache survives restarts. SQLite
+# is only touched from one dedicated thread: `get` awaits its loads, `put` queues
+# its writes there and returns at once.
+class ExerciseCache:
+    def __init__(self, max_entries: int, ttl_seconds: int, variants: int, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.variants = variants
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, List[Tuple[float, Variant]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def make_key(model: str, concept: str, version: int) -> str:
+        return f"{model}|v{version}|{' '.join(concept.lower().split())}"
+
+    async def get(self, key: str) -> Optional[Variant]:
+        if key not in self._entries and self.db_path:
+            cutoff = time.time() - self.ttl_seconds
+            variants = await asyncio.get_running_loop().run_in_executor(self._db_thread(), self._db_load, key, cutoff)
+            if variants and key not in self._entries:  # a `put` may have got there first
+                self._store(key, variants)
+        fresh = self._fresh_variants(key)
+        if len(fresh) < self.variants:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return random.choice(fresh)[1]
+
+    def put(self, key: str, exercise: str, hint: str) -> None:
+        now = time.time()
+        variants = self._fresh_variants(key)
+        if any(pair == (exercise, hint) for _, pair in variants):
+            return  # coalesced requests hand back the same pair
+        variants.append((now, (exercise, hint)))
+        del variants[:-self.variants]
+        self._store(key, variants)
+        if self.db_path:
+            self._db_thread().submit(self._db_put, key, now, exercise, hint).add_done_callback(self._written)
+
+    def close(self) -> None:
+        # Waits for queued writes; the thread is started again on the next use.
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+        }
+
+    def _store(self, key: str, variants: List[Tuple[float, Variant]]) -> None:
+        self._entries[key] = variants
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _fresh_variants(self, key: str) -> List[Tuple[float, Variant]]:
+        cutoff = time.time() - self.ttl_seconds
+        variants = self._entries.get(key)
+        if not variants:
+            return []
+        fresh = [v for v in variants if v[0] >= cutoff]
+        if len(fresh) != len(variants):
+            self._entries[key] = fresh
+        return fresh
+
+    # --- Persistent tier (runs on the dedicated thread) ---
+    def _db_thread(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exercise-cache")
+        return self._executor
+
+    @staticmethod
+    def _written(future: Future) -> None:
+        if future.exception() is not None:
+            logger.warning("Persisting an exercise cache entry failed: %r", future.exception())
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS exercise_cache ("
+                "key TEXT NOT NULL, created_at REAL NOT NULL, exercise TEXT NOT NULL, hint TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_exercise_cache_key ON exercise_cache (key, created_at)")
+            self._db.commit()
+        return self._db
+
+    def _db_load(self, key: str, cutoff: float) -> List[Tuple[float, Variant]]:
+        db = self._connect()
+        db.execute("DELETE FROM exercise_cache WHERE key = ? AND created_at < ?", (key, cutoff))
+        rows = db.execute(
+            "SELECT created_at, exercise, hint FROM exercise_cache WHERE key = ? ORDER BY created_at",
+            (key,),
+        ).fetchall()
+        db.commit()
+        return [(created_at, (exercise, hint)) for created_at, exercise, hint in rows[-self.variants:]]
+
+    def _db_put(self, key: str, created_at: float, exercise: str, hint: str) -> None:
+        db = self._connect()
+        db.execute(
+            "INSERT INTO exercise_cache (key, created_at, exercise, hint) VALUES (?, ?, ?, ?)",
+            (key, created_at, exercise, hint),
+        )
+        db.execute(
+            "DELETE FROM exercise_cache WHERE key = ? AND created_at NOT IN "
+            "(SELECT created_at FROM exercise_cache WHERE key = ? ORDER BY created_at DESC LIMIT ?)",
+            (key, key, self.variants),
+        )
+        db.commit()
+
+exercise_cache = ExerciseCache(
+    max_entries=settings.EXERCISE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EXERCISE_CACHE_TTL_SECONDS,
+    variants=settings.EXERCISE_CACHE_VARIANTS,
+    db_path=settings.exercise_cache_path if settings.EXERCISE_CACHE_PERSIST else None,
+)
@@ -0,0 +1,135 @@
+# Standard library imports
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+__all__ = [
+    "CompressionMiddleware",
+    "choose_encoding",
+]
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # levels above ~5 cost far more CPU than they save on JSON
+
+# Already compressed, or streamed event by event: never worth touching.
+SKIPPED_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/pdf",
+                 "application/octet-stream")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    # Highest q-value wins; brotli is preferred over gzip on a tie.
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip()] = q
+    candidates = [e for e in (("br",) if brotli is not None else ()) + ("gzip",)
+                  if weights.get(e, weights.get("*", 0.0)) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda e: weights.get(e, weights.get("*", 0.0)))
+
+def _vary_accept_encoding(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    vary = [value for name, value in headers if name.lower() == b"vary"]
+    if any(b"accept-encoding" in value.lower() or value.strip() == b"*" for value in vary):
+        return headers
+    others = [(name, value) for name, value in headers if name.lower() != b"vary"]
+    return others + [(b"vary", b", ".join(vary + [b"Accept-Encoding"]))]
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+# Pure ASGI response compression negotiated from Accept-Encoding (br or gzip).
+# The body is held back until it reaches `minimum_size` bytes: a response that
+# ends before that is sent as is, so small answers don't pay for compression.
+# Server-sent events and already compressed types pass straight through. Every
+# other response carries `Vary: Accept-Encoding`, compressed or not, since the same
+# route may be compressed for another client or once its body grows.
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+
+        start: Optional[dict] = None
+        pending: List[bytes] = []
+        pending_size = 0
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, pending_size, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+                if b"content-encoding" in headers or content_type.startswith(SKIPPED_TYPES):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = {**message, "headers": _vary_accept_encoding(list(message.get("headers", [])))}
+                if encoding is None:
+                    passthrough = True
+                    await send(start)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                pending.append(body)
+                pending_size += len(body)
+                if pending_size < self.minimum_size:
+                    if more_body:
+                        return
+                    # Finished below the threshold: send it uncompressed.
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(pending), "more_body": False})
+                    return
+                compressor = _Compressor(encoding)
+                headers = [(name, value) for name, value in start["headers"] if name.lower() != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                await send({**start, "headers": headers})
+                body = b"".join(pending)
+                pending.clear()
+            await send({"type": "http.response.body", "body": compressor.compress(body, not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
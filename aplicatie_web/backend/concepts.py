@@ -0,0 +1,159 @@
+# Standard library imports
+import asyncio
+import logging
+import time
+from typing import Any
+
+# Local imports
+import llm
+from config import settings
+from matcher import ConceptMatcher
+from packing import pack, pack_chunks
+
+__all__ = [
+    "MAX_CONTENT_LENGTH",
+    "document_input",
+    "extract_concepts",
+    "extract_concepts_chunked",
+    "extraction_key",
+    "parse_concept_list",
+    "split_into_chunks",
+    "merge_concepts",
+    "map_concept_links",
+]
+
+logger = logging.getLogger(__name__)
+
+MAX_CONTENT_LENGTH = 4000
+# Bump EXTRACTION_PROMPT_VERSION whenever the prompt changes, so stored extractions are redone.
+EXTRACTION_PROMPT_VERSION = 1
+
+def extraction_key() -> str:
+    # Identifies what produced an extraction; a stored one is only reused under the same key.
+    return "|".join(map(str, (
+        settings.OPENAI_MODEL, f"v{EXTRACTION_PROMPT_VERSION}", settings.EXTRACTION_MODE,
+        f"packing={settings.EXTRACTION_PACKING}", settings.EXTRACTION_CHUNK_TOKENS,
+        settings.EXTRACTION_CHUNK_CHARS, settings.EXTRACTION_MAX_CHUNKS,
+    )))
+
+def document_input(pages: list[str]) -> str:
+    # What "truncate" mode sends: the densest paragraphs within one call's token budget, or
+    # the beginning of the document when packing is off or finds nothing programming-related.
+    packed = pack(pages, settings.EXTRACTION_CHUNK_TOKENS) if settings.EXTRACTION_PACKING else ""
+    return packed or "\n\n".join(pages)[:MAX_CONTENT_LENGTH]
+
+async def extract_concepts(text: str, session_id: str = "") -> str:
+    # Packed input is already cut to a token budget; a character cap could split it mid-paragraph.
+    gpt_input = text if settings.EXTRACTION_PACKING else text[:MAX_CONTENT_LENGTH]
+    prompt = (
+        "Extract a list of programming concepts mentioned or explained in the text below. "
+        "Return them as a comma-separated list only, with no explanations or formatting.\n\n"
+        f"{gpt_input}\n\nList:"
+    )
+    try:
+        content = await llm.complete(
+            [
+                {"role": "system", "content": "You extract programming concepts from university course material."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            endpoint="extract_concepts",
+            priority=llm.Priority.BULK,
+            session_id=session_id
+        )
+        return content.strip()
+    except Exception as e:
+        logger.error("OpenAI extraction failed: %s", e)
+        raise RuntimeError(f"OpenAI request has failed: {e}")
+
+def parse_concept_list(concept_string: str) -> list[str]:
+    return [c.strip() for c in concept_string.split(",") if c.strip()]
+
+# --- Map-reduce extraction for long documents ---
+def _split_long(text: str, max_chars: int) -> list[str]:
+    pieces, current = [], ""
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = ""
+        while len(word) > max_chars:
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_into_chunks(pages: list[str], max_chars: int) -> list[str]:
+    # Whole pages are kept together when they fit; longer pages fall back to paragraphs,
+    # and paragraphs longer than a chunk are cut on whitespace.
+    units = []
+    for page in pages:
+        page = page.strip()
+        if len(page) <= max_chars:
+            units.append(page)
+            continue
+        for paragraph in page.split("\n\n"):
+            paragraph = paragraph.strip()
+            units.extend([paragraph] if len(paragraph) <= max_chars else _split_long(paragraph, max_chars))
+
+    chunks, current = [], ""
+    for unit in filter(None, units):
+        if current and len(current) + 2 + len(unit) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{unit}" if current else unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+def merge_concepts(concept_lists: list[list[str]]) -> list[str]:
+    # Deduplicates case- and whitespace-insensitively, keeping the first spelling seen;
+    # order follows chunk order, then position within the chunk, so results are deterministic.
+    merged: dict[str, str] = {}
+    for concepts in concept_lists:
+        for concept in concepts:
+            merged.setdefault(" ".join(concept.casefold().split()), concept)
+    return list(merged.values())
+
+async def extract_concepts_chunked(pages: list[str], session_id: str = "") -> tuple[list[str], list[dict[str, Any]]]:
+    chunks = []
+    if settings.EXTRACTION_PACKING:
+        # Scoring a long document is CPU work; keep it off the event loop.
+        chunks = await asyncio.to_thread(pack_chunks, pages, settings.EXTRACTION_CHUNK_TOKENS,
+                                         settings.EXTRACTION_MAX_CHUNKS)
+    if not chunks:
+        chunks = split_into_chunks(pages, settings.EXTRACTION_CHUNK_CHARS)
+    if len(chunks) > settings.EXTRACTION_MAX_CHUNKS:
+        logger.warning("Document has %d chunks, only the first %d are analysed", len(chunks), settings.EXTRACTION_MAX_CHUNKS)
+        chunks = chunks[:settings.EXTRACTION_MAX_CHUNKS]
+    semaphore = asyncio.Semaphore(settings.EXTRACTION_PARALLELISM)
+
+    async def run(index: int, chunk: str) -> tuple[list[str], dict[str, Any]]:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                concepts = parse_concept_list(await extract_concepts(chunk, session_id))
+                error = None
+            except RuntimeError as e:
+                concepts, error = [], str(e)
+            seconds = time.perf_counter() - started
+        logger.info("Extraction chunk %d/%d: %d chars, %d concepts in %.2fs",
+                    index + 1, len(chunks), len(chunk), len(concepts), seconds)
+        return concepts, {
+            "index": index,
+            "chars": len(chunk),
+            "concepts": len(concepts),
+            "seconds": round(seconds, 3),
+            "error": error,
+        }
+
+    results = await asyncio.gather(*(run(i, chunk) for i, chunk in enumerate(chunks)))
+    timings = [timing for _, timing in results]
+    if results and all(timing["error"] for timing in timings):
+        raise RuntimeError(f"OpenAI request has failed for all {len(chunks)} chunks: {timings[0]['error']}")
+    return merge_concepts([concepts for concepts, _ in results]), timings
+
+def map_concept_links(text: str, concepts: list[str]) -> dict[str, dict[str, int]]:
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    return ConceptMatcher(concepts).links(paragraphs)
@@ -1,9 +1,10 @@
 # Standard library imports
-from typing import Any, Annotated
+import os
+from typing import Any, Annotated, Literal, Optional
 from urllib.parse import urlparse
 
 # Third-party imports
-from pydantic import computed_field, BeforeValidator, AfterValidator, Field
+from pydantic import computed_field, model_validator, BeforeValidator, AfterValidator, Field
 from pydantic_settings import BaseSettings
 
 # --- Defaults for Settings ---
@@ -11,11 +12,70 @@ DEFAULT_UPLOAD_DIR = "uploads"
 DEFAULT_OPENAI_MODEL = "gpt-4-turbo"
 DEFAULT_CORS_ORIGINS = ["http://localhost:5173"]
 DEFAULT_PORT = 8081
+DEFAULT_COMPRESSION_MIN_SIZE_BYTES = 1024
+DEFAULT_WEB_CONCURRENCY = 1
 DEFAULT_MAX_SIZE_MB = 10
-DEFAULT_SUPPORTED_EXTENSIONS = ["pdf", "doc", "docx", "txt"]
+DEFAULT_DB_POOL_SIZE = 10
+DEFAULT_DB_MAX_OVERFLOW = 20
+DEFAULT_DB_POOL_TIMEOUT_SECONDS = 30
+DEFAULT_UPLOAD_STORE_MAX_MB = 1024
+DEFAULT_OPENAI_MAX_CONNECTIONS = 100
+DEFAULT_OPENAI_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_OPENAI_MAX_CONCURRENT_REQUESTS = 64
+DEFAULT_OPENAI_REQUESTS_PER_MINUTE = 500
+DEFAULT_OPENAI_TOKENS_PER_MINUTE = 30000
+DEFAULT_LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS = 15
+DEFAULT_LLM_QUEUE_TIMEOUT_GENERATION_SECONDS = 30
+DEFAULT_LLM_QUEUE_TIMEOUT_BULK_SECONDS = 600
+DEFAULT_LLM_DEADLINE_CHECK_SOLUTION_SECONDS = 20
+DEFAULT_LLM_DEADLINE_GENERATE_EXERCISE_SECONDS = 30
+DEFAULT_LLM_DEADLINE_GENERATE_EXERCISE_BATCH_SECONDS = 60
+DEFAULT_LLM_DEADLINE_EXTRACT_CONCEPTS_SECONDS = 120
+DEFAULT_LLM_DEADLINE_EXERCISE_POOL_SECONDS = 120
+DEFAULT_LLM_DEADLINE_DEFAULT_SECONDS = 30
+DEFAULT_LLM_STREAM_IDLE_TIMEOUT_SECONDS = 15
+DEFAULT_LLM_MAX_RETRIES = 2
+DEFAULT_LLM_RETRY_BASE_MS = 500
+DEFAULT_LLM_RETRY_MAX_MS = 8000
+DEFAULT_LLM_HEDGE_ENABLED = False
+DEFAULT_LLM_HEDGE_MIN_SAMPLES = 20
+DEFAULT_LLM_BREAKER_FAILURE_THRESHOLD = 5
+DEFAULT_LLM_BREAKER_RESET_SECONDS = 30
+DEFAULT_EXERCISE_CACHE_MAX_ENTRIES = 1024
+DEFAULT_EXERCISE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_EXERCISE_CACHE_VARIANTS = 3
+DEFAULT_EXERCISE_POOL_SIZE = 2
+DEFAULT_EXERCISE_POOL_MAX_CONCEPTS = 500
+DEFAULT_EXERCISE_POOL_CONCURRENCY = 2
+DEFAULT_EXERCISE_POOL_TOKENS_PER_MINUTE = 20000
+DEFAULT_EXERCISE_BATCH_GROUP_SIZE = 5
+DEFAULT_EXERCISE_BATCH_MAX_CONCEPTS = 50
+DEFAULT_EXTRACTION_MODE = "chunked"
+DEFAULT_EXTRACTION_CHUNK_CHARS = 4000
+DEFAULT_EXTRACTION_PARALLELISM = 4
+DEFAULT_EXTRACTION_MAX_CHUNKS = 50
+DEFAULT_EXTRACTION_PACKING = True
+DEFAULT_EXTRACTION_CHUNK_TOKENS = 1000
+DEFAULT_PARSER_PAGES_PER_TASK = 16
+DEFAULT_PARSER_TASK_TIMEOUT_SECONDS = 60
+DEFAULT_PARSER_WORKER_MEMORY_MB = 1024
+DEFAULT_PARSER_MAX_TASKS_PER_CHILD = 100
+DEFAULT_CONCEPT_GRAPH_TOP_K = 10
+DEFAULT_CONCEPT_GRAPH_MAX_PAGE_SIZE = 200
+DEFAULT_SESSION_BACKEND = "memory"
+DEFAULT_SESSION_MAX_SESSIONS = 10000
+DEFAULT_SESSION_IDLE_TTL_SECONDS = 24 * 3600
+DEFAULT_SESSION_MAX_MB = 256
+DEFAULT_ARGON2_TIME_COST = 2
+DEFAULT_ARGON2_MEMORY_COST = 49152
+DEFAULT_ARGON2_PARALLELISM = 1
+DEFAULT_PASSWORD_HASH_QUEUE_DEPTH = 32
+DEFAULT_PROFILING_SAMPLE_RATE = 0.0
+DEFAULT_PROFILING_INTERVAL_MS = 5
+DEFAULT_PROFILING_MAX_FILES = 100
+DEFAULT_SUPPORTED_EXTENSIONS = ["pdf", "docx", "txt"]
 DEFAULT_SUPPORTED_MIME_TYPES = [
     "application/pdf",
-    "application/msword",
     "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
     "text/plain",
 ]
@@ -27,7 +87,67 @@ __all__ = [
     "DEFAULT_OPENAI_MODEL",
     "DEFAULT_CORS_ORIGINS",
     "DEFAULT_PORT",
+    "DEFAULT_COMPRESSION_MIN_SIZE_BYTES",
+    "DEFAULT_WEB_CONCURRENCY",
     "DEFAULT_MAX_SIZE_MB",
+    "DEFAULT_DB_POOL_SIZE",
+    "DEFAULT_DB_MAX_OVERFLOW",
+    "DEFAULT_DB_POOL_TIMEOUT_SECONDS",
+    "DEFAULT_UPLOAD_STORE_MAX_MB",
+    "DEFAULT_OPENAI_MAX_CONNECTIONS",
+    "DEFAULT_OPENAI_MAX_KEEPALIVE_CONNECTIONS",
+    "DEFAULT_OPENAI_MAX_CONCURRENT_REQUESTS",
+    "DEFAULT_OPENAI_REQUESTS_PER_MINUTE",
+    "DEFAULT_OPENAI_TOKENS_PER_MINUTE",
+    "DEFAULT_LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS",
+    "DEFAULT_LLM_QUEUE_TIMEOUT_GENERATION_SECONDS",
+    "DEFAULT_LLM_QUEUE_TIMEOUT_BULK_SECONDS",
+    "DEFAULT_LLM_DEADLINE_CHECK_SOLUTION_SECONDS",
+    "DEFAULT_LLM_DEADLINE_GENERATE_EXERCISE_SECONDS",
+    "DEFAULT_LLM_DEADLINE_GENERATE_EXERCISE_BATCH_SECONDS",
+    "DEFAULT_LLM_DEADLINE_EXTRACT_CONCEPTS_SECONDS",
+    "DEFAULT_LLM_DEADLINE_EXERCISE_POOL_SECONDS",
+    "DEFAULT_LLM_DEADLINE_DEFAULT_SECONDS",
+    "DEFAULT_LLM_STREAM_IDLE_TIMEOUT_SECONDS",
+    "DEFAULT_LLM_MAX_RETRIES",
+    "DEFAULT_LLM_RETRY_BASE_MS",
+    "DEFAULT_LLM_RETRY_MAX_MS",
+    "DEFAULT_LLM_HEDGE_ENABLED",
+    "DEFAULT_LLM_HEDGE_MIN_SAMPLES",
+    "DEFAULT_LLM_BREAKER_FAILURE_THRESHOLD",
+    "DEFAULT_LLM_BREAKER_RESET_SECONDS",
+    "DEFAULT_EXERCISE_CACHE_MAX_ENTRIES",
+    "DEFAULT_EXERCISE_CACHE_TTL_SECONDS",
+    "DEFAULT_EXERCISE_CACHE_VARIANTS",
+    "DEFAULT_EXERCISE_POOL_SIZE",
+    "DEFAULT_EXERCISE_POOL_MAX_CONCEPTS",
+    "DEFAULT_EXERCISE_POOL_CONCURRENCY",
+    "DEFAULT_EXERCISE_POOL_TOKENS_PER_MINUTE",
+    "DEFAULT_EXERCISE_BATCH_GROUP_SIZE",
+    "DEFAULT_EXERCISE_BATCH_MAX_CONCEPTS",
+    "DEFAULT_EXTRACTION_MODE",
+    "DEFAULT_EXTRACTION_CHUNK_CHARS",
+    "DEFAULT_EXTRACTION_PARALLELISM",
+    "DEFAULT_EXTRACTION_MAX_CHUNKS",
+    "DEFAULT_EXTRACTION_PACKING",
+    "DEFAULT_EXTRACTION_CHUNK_TOKENS",
+    "DEFAULT_PARSER_PAGES_PER_TASK",
+    "DEFAULT_PARSER_TASK_TIMEOUT_SECONDS",
+    "DEFAULT_PARSER_WORKER_MEMORY_MB",
+    "DEFAULT_PARSER_MAX_TASKS_PER_CHILD",
+    "DEFAULT_CONCEPT_GRAPH_TOP_K",
+    "DEFAULT_CONCEPT_GRAPH_MAX_PAGE_SIZE",
+    "DEFAULT_SESSION_BACKEND",
+    "DEFAULT_SESSION_MAX_SESSIONS",
+    "DEFAULT_SESSION_IDLE_TTL_SECONDS",
+    "DEFAULT_SESSION_MAX_MB",
+    "DEFAULT_ARGON2_TIME_COST",
+    "DEFAULT_ARGON2_MEMORY_COST",
+    "DEFAULT_ARGON2_PARALLELISM",
+    "DEFAULT_PASSWORD_HASH_QUEUE_DEPTH",
+    "DEFAULT_PROFILING_SAMPLE_RATE",
+    "DEFAULT_PROFILING_INTERVAL_MS",
+    "DEFAULT_PROFILING_MAX_FILES",
     "DEFAULT_SUPPORTED_EXTENSIONS",
     "DEFAULT_SUPPORTED_MIME_TYPES",
 ]
@@ -69,6 +189,16 @@ def _positive_int(v: int) -> int:
         raise ValueError("must be a positive integer")
     return v
 
+def _non_negative_int(v: int) -> int:
+    if v < 0:
+        raise ValueError("must not be negative")
+    return v
+
+def _fraction(v: float) -> float:
+    if not 0 <= v <= 1:
+        raise ValueError("must be between 0 and 1")
+    return v
+
 def _validate_port(v: int) -> int:
     if not (1 <= v <= 65535):
         raise ValueError("PORT must be between 1 and 65535")
@@ -112,6 +242,12 @@ def _norm_mimes(v: Any) -> list[str]:
             raise ValueError(f"Invalid MIME type format: {mime_type}")
     return mime_types
 
+def _norm_optional_url(v: Any) -> Optional[str]:
+    url = (v or "").strip().strip("'\"")
+    if url and not url.startswith(("http://", "https://")):
+        raise ValueError(f"Invalid URL format: {url}")
+    return url or None
+
 def _norm_openai_model(v: Any) -> str:
     model = (v or "").strip()
     if not model:
@@ -131,10 +267,41 @@ class Settings(BaseSettings):
     # --- AI model configuration ---
     OPENAI_MODEL: Annotated[str, BeforeValidator(_norm_openai_model)] = DEFAULT_OPENAI_MODEL
     OPENAI_API_KEY: Annotated[str, Field(repr=False)]
+    OPENAI_BASE_URL: Annotated[Optional[str], BeforeValidator(_norm_optional_url)] = None
+
+    # --- OpenAI connection pool ---
+    OPENAI_MAX_CONNECTIONS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_OPENAI_MAX_CONNECTIONS
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_OPENAI_MAX_KEEPALIVE_CONNECTIONS
+    OPENAI_MAX_CONCURRENT_REQUESTS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_OPENAI_MAX_CONCURRENT_REQUESTS
+
+    # --- OpenAI call scheduling ---
+    OPENAI_REQUESTS_PER_MINUTE: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_OPENAI_REQUESTS_PER_MINUTE
+    OPENAI_TOKENS_PER_MINUTE: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_OPENAI_TOKENS_PER_MINUTE
+    LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS
+    LLM_QUEUE_TIMEOUT_GENERATION_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_QUEUE_TIMEOUT_GENERATION_SECONDS
+    LLM_QUEUE_TIMEOUT_BULK_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_QUEUE_TIMEOUT_BULK_SECONDS
+
+    # --- OpenAI call resilience ---
+    LLM_DEADLINE_CHECK_SOLUTION_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_DEADLINE_CHECK_SOLUTION_SECONDS
+    LLM_DEADLINE_GENERATE_EXERCISE_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_DEADLINE_GENERATE_EXERCISE_SECONDS
+    LLM_DEADLINE_GENERATE_EXERCISE_BATCH_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_DEADLINE_GENERATE_EXERCISE_BATCH_SECONDS
+    LLM_DEADLINE_EXTRACT_CONCEPTS_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_DEADLINE_EXTRACT_CONCEPTS_SECONDS
+    LLM_DEADLINE_EXERCISE_POOL_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_DEADLINE_EXERCISE_POOL_SECONDS
+    LLM_DEADLINE_DEFAULT_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_DEADLINE_DEFAULT_SECONDS
+    LLM_STREAM_IDLE_TIMEOUT_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_STREAM_IDLE_TIMEOUT_SECONDS
+    LLM_MAX_RETRIES: Annotated[int, AfterValidator(_non_negative_int)] = DEFAULT_LLM_MAX_RETRIES
+    LLM_RETRY_BASE_MS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_RETRY_BASE_MS
+    LLM_RETRY_MAX_MS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_RETRY_MAX_MS
+    LLM_HEDGE_ENABLED: bool = DEFAULT_LLM_HEDGE_ENABLED
+    LLM_HEDGE_MIN_SAMPLES: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_HEDGE_MIN_SAMPLES
+    LLM_BREAKER_FAILURE_THRESHOLD: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_BREAKER_FAILURE_THRESHOLD
+    LLM_BREAKER_RESET_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_LLM_BREAKER_RESET_SECONDS
 
     # --- Server configuration ---
     CORS_ORIGINS: Annotated[list[str], BeforeValidator(_norm_cors)] = DEFAULT_CORS_ORIGINS
     PORT: Annotated[int, AfterValidator(_validate_port)] = DEFAULT_PORT
+    COMPRESSION_MIN_SIZE_BYTES: Annotated[int, AfterValidator(_non_negative_int)] = DEFAULT_COMPRESSION_MIN_SIZE_BYTES
+    WEB_CONCURRENCY: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_WEB_CONCURRENCY
 
     # --- Database connection ---
     DATABASE_URL: Annotated[
@@ -145,17 +312,121 @@ class Settings(BaseSettings):
         default="",
         description="SQLAlchemy connection string, e.g. postgresql+psycopg://postgres:<PASS>@localhost:5432/codeflow",
     )
+    DB_POOL_SIZE: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_DB_POOL_SIZE
+    DB_MAX_OVERFLOW: Annotated[int, AfterValidator(_non_negative_int)] = DEFAULT_DB_MAX_OVERFLOW
+    DB_POOL_TIMEOUT_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_DB_POOL_TIMEOUT_SECONDS
+    DB_POOL_PRE_PING: bool = True
 
     # --- File upload constraints ---
     MAX_SIZE_MB: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_MAX_SIZE_MB
+    UPLOAD_STORE_MAX_MB: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_UPLOAD_STORE_MAX_MB
     SUPPORTED_EXTENSIONS: Annotated[list[str], BeforeValidator(_norm_exts)] = DEFAULT_SUPPORTED_EXTENSIONS
     SUPPORTED_MIME_TYPES: Annotated[list[str], BeforeValidator(_norm_mimes)] = DEFAULT_SUPPORTED_MIME_TYPES
 
+    # --- Exercise cache ---
+    EXERCISE_CACHE_MAX_ENTRIES: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_CACHE_MAX_ENTRIES
+    EXERCISE_CACHE_TTL_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_CACHE_TTL_SECONDS
+    EXERCISE_CACHE_VARIANTS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_CACHE_VARIANTS
+    EXERCISE_CACHE_PERSIST: bool = False
+
+    # --- Precomputed exercise pool ---
+    EXERCISE_POOL_SIZE: Annotated[int, AfterValidator(_non_negative_int)] = DEFAULT_EXERCISE_POOL_SIZE
+    EXERCISE_POOL_MAX_CONCEPTS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_POOL_MAX_CONCEPTS
+    EXERCISE_POOL_CONCURRENCY: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_POOL_CONCURRENCY
+    EXERCISE_POOL_TOKENS_PER_MINUTE: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_POOL_TOKENS_PER_MINUTE
+
+    # --- Batch exercise generation ---
+    EXERCISE_BATCH_GROUP_SIZE: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_BATCH_GROUP_SIZE
+    EXERCISE_BATCH_MAX_CONCEPTS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXERCISE_BATCH_MAX_CONCEPTS
+
+    # --- Concept extraction ---
+    EXTRACTION_MODE: Literal["truncate", "chunked"] = DEFAULT_EXTRACTION_MODE
+    EXTRACTION_CHUNK_CHARS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXTRACTION_CHUNK_CHARS
+    EXTRACTION_PARALLELISM: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXTRACTION_PARALLELISM
+    EXTRACTION_MAX_CHUNKS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXTRACTION_MAX_CHUNKS
+    EXTRACTION_PACKING: bool = DEFAULT_EXTRACTION_PACKING
+    EXTRACTION_CHUNK_TOKENS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_EXTRACTION_CHUNK_TOKENS
+
+    # --- Document parsing ---
+    PARSER_WORKERS: Optional[Annotated[int, AfterValidator(_positive_int)]] = None
+    PARSER_PAGES_PER_TASK: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_PARSER_PAGES_PER_TASK
+    PARSER_TASK_TIMEOUT_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_PARSER_TASK_TIMEOUT_SECONDS
+    PARSER_WORKER_MEMORY_MB: Annotated[int, AfterValidator(_non_negative_int)] = DEFAULT_PARSER_WORKER_MEMORY_MB
+    PARSER_MAX_TASKS_PER_CHILD: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_PARSER_MAX_TASKS_PER_CHILD
+
+    # --- Concept graph ---
+    CONCEPT_GRAPH_TOP_K: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_CONCEPT_GRAPH_TOP_K
+    CONCEPT_GRAPH_MAX_PAGE_SIZE: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_CONCEPT_GRAPH_MAX_PAGE_SIZE
+
+    # --- Session state ---
+    SESSION_BACKEND: Literal["memory", "database"] = DEFAULT_SESSION_BACKEND
+    SESSION_MAX_SESSIONS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_SESSION_MAX_SESSIONS
+    SESSION_IDLE_TTL_SECONDS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_SESSION_IDLE_TTL_SECONDS
+    SESSION_MAX_MB: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_SESSION_MAX_MB
+
+    # --- Password hashing ---
+    ARGON2_TIME_COST: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_ARGON2_TIME_COST
+    ARGON2_MEMORY_COST: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_ARGON2_MEMORY_COST
+    ARGON2_PARALLELISM: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_ARGON2_PARALLELISM
+    PASSWORD_HASH_WORKERS: Optional[Annotated[int, AfterValidator(_positive_int)]] = None
+    PASSWORD_HASH_QUEUE_DEPTH: Annotated[int, AfterValidator(_non_negative_int)] = DEFAULT_PASSWORD_HASH_QUEUE_DEPTH
+
+    # --- Request profiling ---
+    PROFILING_TOKEN: Annotated[Optional[str], Field(repr=False)] = None
+    PROFILING_SAMPLE_RATE: Annotated[float, AfterValidator(_fraction)] = DEFAULT_PROFILING_SAMPLE_RATE
+    PROFILING_INTERVAL_MS: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_PROFILING_INTERVAL_MS
+    PROFILING_MAX_FILES: Annotated[int, AfterValidator(_positive_int)] = DEFAULT_PROFILING_MAX_FILES
+
     # --- Computed properties ---
     @computed_field(return_type=int)
     def max_size_bytes(self) -> int:
         return self.MAX_SIZE_MB * 1024 * 1024
 
+    @computed_field(return_type=int)
+    def password_hash_workers(self) -> int:
+        return self.PASSWORD_HASH_WORKERS or min(4, os.cpu_count() or 1)
+
+    @computed_field(return_type=int)
+    def parser_workers(self) -> int:
+        return self.PARSER_WORKERS or min(4, os.cpu_count() or 1)
+
+    # The OpenAI tier and the pool budget are shared by every worker process.
+    @computed_field(return_type=int)
+    def openai_requests_per_minute_per_worker(self) -> int:
+        return max(1, self.OPENAI_REQUESTS_PER_MINUTE // self.WEB_CONCURRENCY)
+
+    @computed_field(return_type=int)
+    def openai_tokens_per_minute_per_worker(self) -> int:
+        return max(1, self.OPENAI_TOKENS_PER_MINUTE // self.WEB_CONCURRENCY)
+
+    @computed_field(return_type=int)
+    def exercise_pool_tokens_per_minute_per_worker(self) -> int:
+        return max(1, self.EXERCISE_POOL_TOKENS_PER_MINUTE // self.WEB_CONCURRENCY)
+
+    @computed_field(return_type=int)
+    def session_max_bytes(self) -> int:
+        return self.SESSION_MAX_MB * 1024 * 1024
+
+    @computed_field(return_type=int)
+    def upload_store_max_bytes(self) -> int:
+        return self.UPLOAD_STORE_MAX_MB * 1024 * 1024
+
+    @computed_field(return_type=str)
+    def exercise_cache_path(self) -> str:
+        return os.path.join(os.path.dirname(self.UPLOAD_DIR), "exercise_cache.sqlite3")
+
+    @computed_field(return_type=str)
+    def profiling_dir(self) -> str:
+        return os.path.join(os.path.dirname(self.UPLOAD_DIR), "profiles")
+
+    # --- Cross-field validation ---
+    @model_validator(mode="after")
+    def _check_shared_state(self) -> "Settings":
+        # Sessions and upload jobs kept in memory are only visible to the worker that created them.
+        if self.WEB_CONCURRENCY > 1 and self.SESSION_BACKEND != "database":
+            raise ValueError("WEB_CONCURRENCY > 1 requires SESSION_BACKEND=database")
+        return self
+
     # --- Pydantic configuration ---
     model_config = {
         "env_file": ".env",
@@ -1,6 +1,10 @@
+import time
+
 from config import settings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 DATABASE_URL = settings.DATABASE_URL
 if not DATABASE_URL:
@@ -9,19 +13,89 @@ if not DATABASE_URL:
         "DATABASE_URL=postgresql+psycopg://postgres:<PASS>@localhost:5432/codeflow."
     )
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-)
+# Counts checkouts, and the ones that found every connection busy and had to wait
+# for a checkin, for the /metrics endpoint.
+class _CountingPoolMixin:
+    checkouts = 0
+    waits = 0
+    wait_seconds = 0.0
+
+    def _do_get(self):
+        self.checkouts += 1
+        if self.checkedin() or self.overflow() < settings.DB_MAX_OVERFLOW:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.waits += 1
+            self.wait_seconds += time.perf_counter() - started
+
+class CountingQueuePool(_CountingPoolMixin, QueuePool):
+    pass
+
+class CountingAsyncQueuePool(_CountingPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+POOL_OPTIONS = {
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+}
+
+engine = create_engine(DATABASE_URL, poolclass=CountingQueuePool, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 Base = declarative_base()
 
+# psycopg 3 speaks both protocols, so the async engine reuses the same URL.
+async_engine = create_async_engine(DATABASE_URL, poolclass=CountingAsyncQueuePool, **POOL_OPTIONS)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Bump SCHEMA_VERSION whenever models_orm changes. create_all only adds missing
+# tables; changes to existing tables go in MIGRATIONS under the version they
+# bring the schema to.
+SCHEMA_VERSION = 2
+MIGRATIONS: dict[int, list[str]] = {}
+SCHEMA_LOCK_KEY = 0x636F6465  # pg_advisory lock id, shared by every worker
+
+def _schema_version(conn) -> int | None:
+    if not conn.dialect.has_table(conn, "schema_version"):
+        return None
+    return conn.execute(text("SELECT max(version) FROM schema_version")).scalar()
+
+# Brings the database schema up to SCHEMA_VERSION and returns whether anything
+# had to be done. A current schema costs one query; otherwise the first worker
+# to take the advisory lock upgrades it and the others find it done. Models must
+# be imported (registered on Base) before this runs.
+def ensure_schema() -> bool:
+    with engine.connect() as conn:
+        if _schema_version(conn) == SCHEMA_VERSION:
+            return False
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        current = _schema_version(conn)
+        if current == SCHEMA_VERSION:
+            return False
+        Base.metadata.create_all(bind=conn)
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version integer NOT NULL)"))
+        # Databases created before versioning (current is None) already match version 1.
+        for version in range((current or 1) + 1, SCHEMA_VERSION + 1):
+            for statement in MIGRATIONS.get(version, []):
+                conn.execute(text(statement))
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": SCHEMA_VERSION})
+    return True
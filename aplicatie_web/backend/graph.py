@@ -0,0 +1,72 @@
+# Standard library imports
+import heapq
+from typing import Any, Dict, List, Optional, Set
+
+__all__ = [
+    "merge_file_links",
+    "related",
+    "strength",
+]
+
+Links = Dict[str, Dict[str, int]]
+
+# Session concept graph, kept in the session store as plain JSON:
+#   files:    the co-occurrence map of every uploaded file, by filename
+#   weights:  those maps summed over all files (symmetric)
+#   strength: total link weight per concept
+#   top:      the `top_k` strongest neighbours per concept, as [concept, weight] pairs
+# A new file only touches the concepts it mentions: its counts are added to
+# `weights` (after subtracting the previous version of a re-uploaded file) and
+# the top-k lists of those concepts alone are rebuilt.
+def _new_graph() -> Dict[str, Any]:
+    return {"files": {}, "weights": {}, "strength": {}, "top": {}}
+
+def _add(graph: Dict[str, Any], links: Links, sign: int, touched: Set[str]) -> None:
+    weights, strengths = graph["weights"], graph["strength"]
+    for concept, neighbours in links.items():
+        row = weights.setdefault(concept, {})
+        for neighbour, count in neighbours.items():
+            weight = row.get(neighbour, 0) + sign * count
+            if weight > 0:
+                row[neighbour] = weight
+            else:
+                row.pop(neighbour, None)
+        total = strengths.get(concept, 0) + sign * sum(neighbours.values())
+        if total > 0:
+            strengths[concept] = total
+        else:
+            strengths.pop(concept, None)
+        if not row:
+            del weights[concept]
+        touched.add(concept)
+
+def merge_file_links(graph: Optional[Dict[str, Any]], filename: str, links: Links, top_k: int) -> Dict[str, Any]:
+    graph = graph or _new_graph()
+    touched: Set[str] = set()
+    previous = graph["files"].pop(filename, None)
+    if previous:
+        _add(graph, previous, -1, touched)
+    _add(graph, links, 1, touched)
+    graph["files"][filename] = links
+
+    top = graph["top"]
+    for concept in touched:
+        row = graph["weights"].get(concept)
+        if row:
+            # Strongest first, ties by name so the order is stable.
+            top[concept] = [list(pair) for pair in heapq.nsmallest(top_k, row.items(), key=lambda p: (-p[1], p[0]))]
+        else:
+            top.pop(concept, None)
+    return graph
+
+def related(graph: Optional[Dict[str, Any]], concept: str, limit: int, min_weight: int = 1) -> List[Dict[str, Any]]:
+    if not graph:
+        return []
+    return [
+        {"concept": neighbour, "weight": weight}
+        for neighbour, weight in graph["top"].get(concept, [])[:limit]
+        if weight >= min_weight
+    ]
+
+def strength(graph: Optional[Dict[str, Any]], concept: str) -> int:
+    return graph["strength"].get(concept, 0) if graph else 0
@@ -0,0 +1,353 @@
+# Standard library imports
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Third-party imports
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import delete, select, update
+
+# Local imports
+from config import settings
+from database import SessionLocal
+from models_orm import UploadJob
+from parsing import MIME_DOC, MIME_DOCX, MIME_PDF, MIME_TEXT, PARSEABLE_MIME_TYPES
+from profiling import span
+
+__all__ = [
+    "StoredUpload",
+    "UploadJobs",
+    "DatabaseUploadJobs",
+    "upload_jobs",
+    "receive_upload",
+    "sniff_mime_type",
+]
+
+SNIFF_SIZE = 8192
+FLUSH_SIZE = 1024 * 1024  # received bytes buffered before a write in a worker thread
+MULTIPART_OVERHEAD = 64 * 1024  # slack for boundaries and part headers in Content-Length
+MAX_FINISHED_JOBS = 1000
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class StoredUpload:
+    filename: str
+    path: str
+    sha256: str
+    size: int
+    mime_type: str
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    if head.startswith(b"%PDF-"):
+        return MIME_PDF
+    if head.startswith(b"PK\x03\x04"):
+        return MIME_DOCX
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return MIME_DOC
+    if b"\x00" in head:
+        return None
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # The sniffed prefix may end in the middle of a multi-byte character.
+        if e.start < len(head) - 3:
+            return None
+    return MIME_TEXT
+
+# Multipart callbacks that stream the "file" part to a temporary file in `dest_dir`,
+# enforcing the size and type limits chunk by chunk. The callbacks run on the event
+# loop and only buffer the data; `flush` hashes and writes it and is meant for a
+# worker thread. The caller moves the finished temporary file to its final place.
+class _UploadWriter:
+    def __init__(self, dest_dir: str, field_name: str):
+        self.dest_dir = dest_dir
+        self.field_name = field_name
+        self.upload: Optional[StoredUpload] = None
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self._out = None
+        self._tmp_path: Optional[str] = None
+        self._filename = ""
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self._head = b""
+        self._mime_type: Optional[str] = None
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._ended = False
+
+    def callbacks(self) -> Dict[str, Callable[..., None]]:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    @property
+    def needs_flush(self) -> bool:
+        return self._pending_size >= FLUSH_SIZE or (self._ended and self._out is not None)
+
+    def flush(self) -> None:
+        if self._out is None:
+            return
+        for chunk in self._pending:
+            self._digest.update(chunk)
+            self._out.write(chunk)
+        self._pending.clear()
+        self._pending_size = 0
+        if self._ended:
+            self._out.close()
+            self._out = None
+            self.upload = StoredUpload(
+                filename=self._filename,
+                path=self._tmp_path,
+                sha256=self._digest.hexdigest(),
+                size=self._size,
+                mime_type=self._mime_type,
+            )
+
+    def discard(self) -> None:
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._tmp_path = None
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("latin-1") != self.field_name or b"filename" not in options:
+            return
+        if self.upload is not None or self._out is not None or self._ended:
+            raise HTTPException(status_code=400, detail="Only one file can be uploaded at a time.")
+
+        filename = os.path.basename(options[b"filename"].decode("utf-8", "replace").replace("\\", "/"))
+        extension = os.path.splitext(filename)[1].lstrip(".").lower()
+        if not filename or extension not in settings.SUPPORTED_EXTENSIONS:
+            raise HTTPException(status_code=415, detail=f"Unsupported file extension: '{extension}'.")
+        self._filename = filename
+        fd, self._tmp_path = tempfile.mkstemp(dir=self.dest_dir, suffix=".part")
+        self._out = os.fdopen(fd, "wb")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._out is None or self._ended:
+            return
+        chunk = data[start:end]
+        self._size += len(chunk)
+        if self._size > settings.max_size_bytes:
+            raise HTTPException(status_code=413, detail=f"File exceeds the {settings.MAX_SIZE_MB} MB limit.")
+        if self._mime_type is None:
+            self._head += chunk[:SNIFF_SIZE - len(self._head)]
+            if len(self._head) >= SNIFF_SIZE:
+                self._check_mime_type()
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+
+    def _on_part_end(self) -> None:
+        if self._out is None or self._ended:
+            return
+        if self._size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+        if self._mime_type is None:
+            self._check_mime_type()
+        self._ended = True
+
+    def _check_mime_type(self) -> None:
+        # Formats we can store but not parse (legacy .doc) are refused here rather than failing the job later.
+        mime_type = sniff_mime_type(self._head)
+        if mime_type not in PARSEABLE_MIME_TYPES or mime_type not in settings.SUPPORTED_MIME_TYPES:
+            raise HTTPException(status_code=415, detail=f"Unsupported file type: '{mime_type or 'unknown'}'.")
+        self._mime_type = mime_type
+
+async def receive_upload(request: Request, dest_dir: str, field_name: str = "file") -> StoredUpload:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > settings.max_size_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {settings.MAX_SIZE_MB} MB limit.")
+
+    writer = _UploadWriter(dest_dir, field_name)
+    parser = MultipartParser(options[b"boundary"], callbacks=writer.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if writer.needs_flush:
+                await asyncio.to_thread(writer.flush)
+        parser.finalize()
+        await asyncio.to_thread(writer.flush)
+    except BaseException:
+        writer.discard()
+        raise
+    if writer.upload is None:
+        raise HTTPException(status_code=400, detail=f"Missing '{field_name}' file field.")
+    return writer.upload
+
+# --- Background job registry ---
+# Upload jobs as plain dicts. The worker that runs a job mutates it in place and
+# calls `save` at each step; `progress` is for frequent updates (pages parsed)
+# that other workers may see a little late. `get` returns what was last saved.
+class UploadJobs:
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def new(session_id: str, filename: str) -> Dict[str, Any]:
+        return {
+            "job_id": secrets.token_urlsafe(16),
+            "session_id": session_id,
+            "filename": filename,
+            "status": "queued",
+            "pages": 0,
+            "concepts": [],
+            "chunks": [],
+            "parsing": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+
+    async def create(self, session_id: str, filename: str) -> Dict[str, Any]:
+        job = self.new(session_id, filename)
+        self._jobs[job["job_id"]] = job
+        self._prune()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        pass  # the registry holds the job itself
+
+    def progress(self, job: Dict[str, Any]) -> None:
+        pass
+
+    async def finish(self, job: Dict[str, Any], status: str, **fields: Any) -> None:
+        job.update(fields, status=status, finished_at=time.time())
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def public(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in job.items() if k != "session_id"}
+
+# Registry shared by every worker through the `upload_jobs` table, so a poll can
+# land on any worker. Progress is written at most every PROGRESS_INTERVAL_SECONDS
+# per job, never over a finished one. Queries run in a worker thread.
+class DatabaseUploadJobs(UploadJobs):
+    PROGRESS_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, session_factory, max_finished: int = MAX_FINISHED_JOBS):
+        super().__init__(max_finished)
+        self.session_factory = session_factory
+        self._saved_at: Dict[str, float] = {}
+        self._pending: Set[asyncio.Task] = set()
+
+    async def create(self, session_id: str, filename: str) -> Dict[str, Any]:
+        job = self.new(session_id, filename)
+
+        def run() -> None:
+            with self.session_factory.begin() as db:
+                db.add(UploadJob(job_id=job["job_id"], session_id=session_id, state=job))
+
+        with span("db"):
+            await asyncio.to_thread(run)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        def run() -> Optional[Dict[str, Any]]:
+            with self.session_factory() as db:
+                return db.execute(select(UploadJob.state).where(UploadJob.job_id == job_id)).scalar_one_or_none()
+
+        with span("db"):
+            return await asyncio.to_thread(run)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._saved_at[job["job_id"]] = time.monotonic()
+        state = dict(job)
+
+        def run() -> None:
+            with self.session_factory.begin() as db:
+                db.execute(
+                    update(UploadJob)
+                    .where(UploadJob.job_id == state["job_id"], UploadJob.finished_at.is_(None))
+                    .values(state=state)
+                )
+
+        with span("db"):
+            await asyncio.to_thread(run)
+
+    def progress(self, job: Dict[str, Any]) -> None:
+        if time.monotonic() - self._saved_at.get(job["job_id"], 0.0) < self.PROGRESS_INTERVAL_SECONDS:
+            return
+        task = asyncio.get_running_loop().create_task(self.save(job))
+        self._pending.add(task)
+        task.add_done_callback(self._saved)
+
+    async def finish(self, job: Dict[str, Any], status: str, **fields: Any) -> None:
+        await super().finish(job, status, **fields)
+        self._saved_at.pop(job["job_id"], None)
+        state = dict(job)
+
+        def run() -> None:
+            with self.session_factory.begin() as db:
+                db.execute(
+                    update(UploadJob)
+                    .where(UploadJob.job_id == state["job_id"])
+                    .values(state=state, finished_at=datetime.now(timezone.utc))
+                )
+                keep = (
+                    select(UploadJob.job_id)
+                    .where(UploadJob.finished_at.is_not(None))
+                    .order_by(UploadJob.finished_at.desc())
+                    .limit(self.max_finished)
+                )
+                db.execute(delete(UploadJob).where(UploadJob.finished_at.is_not(None), UploadJob.job_id.not_in(keep)))
+
+        with span("db"):
+            await asyncio.to_thread(run)
+
+    def _saved(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Saving upload job progress failed: %r", task.exception())
+
+def create_upload_jobs() -> UploadJobs:
+    if settings.SESSION_BACKEND == "database":
+        return DatabaseUploadJobs(SessionLocal)
+    return UploadJobs()
+
+upload_jobs = create_upload_jobs()
@@ -0,0 +1,272 @@
+# Standard library imports
+import asyncio
+import hashlib
+import json
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
+
+# Local imports
+from config import settings
+from profiling import span
+from metrics import LLM_ERRORS, LLM_REQUEST_SECONDS, LLM_REQUESTS_IN_FLIGHT, LLM_RETRIES, LLM_TOKENS
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, UpstreamGuard
+from scheduler import LLMScheduler, Priority, QueueTimeout
+from singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+__all__ = [
+    "client",
+    "get_client",
+    "coalescer",
+    "scheduler",
+    "Priority",
+    "QueueTimeout",
+    "CircuitOpen",
+    "DeadlineExceeded",
+    "guard",
+    "complete",
+    "stream",
+    "aclose",
+]
+
+_client: Optional["AsyncOpenAI"] = None
+
+# Shared async client: one connection pool per worker, reused by every request.
+# Retries are left to `guard`, which knows the caller's deadline. The openai
+# package takes about half a second to import, so it is loaded by the first
+# call rather than at worker start.
+def get_client() -> "AsyncOpenAI":
+    global _client
+    if _client is None:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                )
+            ),
+        )
+    return _client
+
+def __getattr__(name: str) -> Any:
+    # `llm.client` keeps working, creating the client on first access.
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Every upstream call is admitted by the scheduler: priority classes, per-session
+# fairness and the request/token rate limits of our OpenAI tier.
+scheduler = LLMScheduler(
+    max_concurrent=settings.OPENAI_MAX_CONCURRENT_REQUESTS,
+    requests_per_minute=settings.openai_requests_per_minute_per_worker,
+    tokens_per_minute=settings.openai_tokens_per_minute_per_worker,
+)
+
+QUEUE_TIMEOUTS = {
+    Priority.INTERACTIVE: settings.LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS,
+    Priority.GENERATION: settings.LLM_QUEUE_TIMEOUT_GENERATION_SECONDS,
+    Priority.BULK: settings.LLM_QUEUE_TIMEOUT_BULK_SECONDS,
+}
+
+# Deadlines, retries, hedging and the circuit breaker shared by every upstream call.
+guard = UpstreamGuard(
+    CircuitBreaker(
+        failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+    ),
+    max_retries=settings.LLM_MAX_RETRIES,
+    retry_base_seconds=settings.LLM_RETRY_BASE_MS / 1000,
+    retry_max_seconds=settings.LLM_RETRY_MAX_MS / 1000,
+    hedge=settings.LLM_HEDGE_ENABLED,
+    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+)
+
+DEADLINES = {
+    "check_solution": settings.LLM_DEADLINE_CHECK_SOLUTION_SECONDS,
+    "generate_exercise": settings.LLM_DEADLINE_GENERATE_EXERCISE_SECONDS,
+    "generate_exercise_batch": settings.LLM_DEADLINE_GENERATE_EXERCISE_BATCH_SECONDS,
+    "extract_concepts": settings.LLM_DEADLINE_EXTRACT_CONCEPTS_SECONDS,
+    "exercise_pool": settings.LLM_DEADLINE_EXERCISE_POOL_SECONDS,
+}
+
+# Completion tokens reserved per call until the real usage is known.
+COMPLETION_TOKENS_ESTIMATE = 400
+
+# Identical prompts that are in flight at the same time share one upstream call.
+coalescer = SingleFlight()
+
+def fingerprint(messages: list[dict[str, Any]], temperature: float, json_mode: bool = False) -> str:
+    payload = json.dumps(
+        {"model": settings.OPENAI_MODEL, "messages": messages, "temperature": temperature, "json": json_mode},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def estimate_tokens(messages: list[dict[str, Any]]) -> int:
+    # About 4 characters per token for English text, plus the completion allowance.
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4 + COMPLETION_TOKENS_ESTIMATE
+
+def _record_usage(endpoint: str, usage: Any) -> Optional[int]:
+    if usage is None:
+        return None
+    prompt_tokens, completion_tokens = usage.prompt_tokens or 0, usage.completion_tokens or 0
+    LLM_TOKENS.inc((endpoint, "prompt"), prompt_tokens)
+    LLM_TOKENS.inc((endpoint, "completion"), completion_tokens)
+    return prompt_tokens + completion_tokens
+
+def _deadline_at(endpoint: str, deadline: Optional[float]) -> float:
+    if deadline is None:
+        deadline = DEADLINES.get(endpoint, settings.LLM_DEADLINE_DEFAULT_SECONDS)
+    return time.monotonic() + deadline
+
+# `endpoint` labels the metrics and picks the deadline; a coalesced call is counted
+# once, under the endpoint that started it, and queued with its caller's priority
+# and session. Only calls of the same priority coalesce, so a live request never
+# waits behind a queued background one. `sent` is set when the request leaves the
+# queue for the upstream. A call that can't start within `queue_timeout` seconds, or before
+# its deadline, raises QueueTimeout; one whose request can't finish within the
+# deadline (retries included) raises DeadlineExceeded, and while the upstream is
+# failing calls raise CircuitOpen without being sent.
+async def complete(messages: list[dict[str, Any]],
+                   *,
+                   temperature: float,
+                   deadline: Optional[float] = None,
+                   endpoint: str = "other",
+                   json_mode: bool = False,
+                   priority: Priority = Priority.GENERATION,
+                   session_id: str = "",
+                   queue_timeout: Optional[float] = None,
+                   sent: Optional[asyncio.Event] = None) -> str:
+    queue_timeout = QUEUE_TIMEOUTS[priority] if queue_timeout is None else queue_timeout
+    deadline_at = _deadline_at(endpoint, deadline)
+
+    async def send(timeout: float) -> Any:
+        if sent is not None:
+            sent.set()
+        LLM_REQUESTS_IN_FLIGHT.inc((endpoint,))
+        started = time.perf_counter()
+        try:
+            with span("llm"):
+                response = await get_client().chat.completions.create(
+                    model=settings.OPENAI_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout,
+                    **({"response_format": {"type": "json_object"}} if json_mode else {}),
+                )
+        except Exception as e:
+            LLM_ERRORS.inc((endpoint, type(e).__name__))
+            raise
+        finally:
+            LLM_REQUESTS_IN_FLIGHT.dec((endpoint,))
+            LLM_REQUEST_SECONDS.observe((endpoint,), time.perf_counter() - started)
+        guard.latency.observe(endpoint, time.perf_counter() - started)
+        return response
+
+    async def attempt(remaining: float) -> str:
+        async with scheduler.slot(priority, session_id, estimate_tokens(messages),
+                                  min(queue_timeout, remaining)) as ticket:
+            response = await guard.request(endpoint, deadline_at, send)
+            ticket.used_tokens = _record_usage(endpoint, getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    async def call() -> str:
+        return await guard.run(endpoint, deadline_at, attempt)
+
+    return await coalescer.do(f"{priority.name}:{fingerprint(messages, temperature, json_mode)}", call)
+
+# Same contract as `complete`, except that the deadline only covers the time to the
+# first chunk: retries happen before anything has been yielded, after that a gap
+# between chunks longer than LLM_STREAM_IDLE_TIMEOUT_SECONDS ends the stream with
+# DeadlineExceeded. Streams are not hedged.
+async def stream(messages: list[dict[str, Any]],
+                 *,
+                 temperature: float,
+                 deadline: Optional[float] = None,
+                 endpoint: str = "other",
+                 priority: Priority = Priority.GENERATION,
+                 session_id: str = "",
+                 queue_timeout: Optional[float] = None) -> AsyncIterator[str]:
+    queue_timeout = QUEUE_TIMEOUTS[priority] if queue_timeout is None else queue_timeout
+    deadline_at = _deadline_at(endpoint, deadline)
+    number = 0
+    while True:
+        number += 1
+        first = True
+        sent = False  # the breaker only hears about calls that reached the HTTP request
+        try:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{endpoint} deadline passed")
+            async with scheduler.slot(priority, session_id, estimate_tokens(messages),
+                                      min(queue_timeout, remaining)) as ticket:
+                timeout = guard.begin(endpoint, deadline_at)
+                sent = True
+                LLM_REQUESTS_IN_FLIGHT.inc((endpoint,))
+                started = time.perf_counter()
+                try:
+                    with span("llm"):  # up to the response headers; chunks arrive as the caller consumes them
+                        response = await get_client().chat.completions.create(
+                            model=settings.OPENAI_MODEL,
+                            messages=messages,
+                            temperature=temperature,
+                            timeout=timeout,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                        )
+                    async with response:
+                        chunks = response.__aiter__()
+                        while True:
+                            wait = deadline_at - time.monotonic() if first else settings.LLM_STREAM_IDLE_TIMEOUT_SECONDS
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, wait))
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                raise DeadlineExceeded(f"{endpoint} stream stalled for {wait:.1f}s")
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                if first:
+                                    first = False
+                                    guard.breaker.record(None)
+                                yield chunk.choices[0].delta.content
+                            # With include_usage the last chunk has no choices and carries the totals.
+                            used_tokens = _record_usage(endpoint, getattr(chunk, "usage", None))
+                            if used_tokens is not None:
+                                ticket.used_tokens = used_tokens
+                except Exception as e:
+                    LLM_ERRORS.inc((endpoint, type(e).__name__))
+                    raise
+                finally:
+                    LLM_REQUESTS_IN_FLIGHT.dec((endpoint,))
+                    LLM_REQUEST_SECONDS.observe((endpoint,), time.perf_counter() - started)
+        except Exception as e:
+            if not first:
+                raise
+            if sent:
+                guard.breaker.record(e)
+            delay = guard.retry_delay(e, number, deadline_at)
+            if delay is None:
+                raise
+            LLM_RETRIES.inc((endpoint, type(e).__name__))
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            if first and sent:
+                guard.breaker.abandon()
+            raise
+        if first:
+            guard.breaker.record(None)
+        return
+
+async def aclose() -> None:
+    if _client is not None:
+        await _client.close()
@@ -1,42 +1,56 @@
 # COMMAND TO RUN BACKEND: `uvicorn main:app --reload --port 8081 --ssl-certfile ..\certs\dev-cert.pem --ssl-keyfile ..\certs\dev-key.pem`
 
 # Standard library imports
-import itertools
+import asyncio
+import json
 import logging
+import math
 import os
-import shutil
-import traceback
-from collections import defaultdict
 from contextlib import asynccontextmanager
-import secrets
-from typing import Any, cast
+from typing import Any, AsyncIterator, cast
 
 # Third-party imports
-from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from openai import OpenAI
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 
 # Local imports
 from auth import auth_router
+from cache import exercise_cache
+from compression import CompressionMiddleware
+from concepts import document_input, extract_concepts, extract_concepts_chunked, extraction_key, map_concept_links, parse_concept_list
 from config import settings
-from schemas import ExerciseRequest, MasterConcept, SolutionSubmission
-from database import Base, engine
-import models_orm
+from schemas import ExerciseBatchRequest, ExerciseRequest, MasterConcept, MasterConceptBatch, SolutionSubmission
+from streaming import SSE_HEADERS, ExerciseStreamParser, sse_event
+from database import SCHEMA_VERSION, engine, async_engine, ensure_schema
+from graph import merge_file_links, related, strength
+from ingest import StoredUpload, receive_upload, upload_jobs
+from metrics import CONTENT_TYPE, Counter, Gauge, MetricsMiddleware, registry
+from parsing import document_parser
+from pool import exercise_pool
+from profiling import ProfilingMiddleware, authorized, profiler, span
+from singleflight import SingleFlight
+from sessions import SessionMiddleware, session_store
+from store import content_store
+from utils import hashing_pool
+import llm
 
-def _is_https(request: Request) -> bool:
-    if request.url.scheme == "https":
-        return True
-    return (request.headers.get("x-forwarded-proto") or "").lower() == "https"
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DEFAULT_SESSION = "fallback_session"
-MAX_CONTENT_LENGTH = 4000
-
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+# Bump EXERCISE_PROMPT_VERSION whenever the template changes, so cached exercises are not reused.
+EXERCISE_PROMPT_VERSION = 1
+EXERCISE_PROMPT_TEMPLATE = (
+    "Generate a beginner-friendly coding exercise for the concept: {concept}. "
+    "Keep it short. Then provide a hint. Format it like this:\n\n"
+    "Exercise:\n<exercise>\n\nHint:\n<hint>"
+)
+EXERCISE_BATCH_PROMPT_TEMPLATE = (
+    "For each programming concept below, generate a short beginner-friendly coding exercise and a hint. "
+    "Answer with a JSON object whose keys are the concepts exactly as written and whose values are objects "
+    "with the string fields \"exercise\" and \"hint\".\n\nConcepts:\n{concepts}"
+)
 
 def get_session_id(request: Request) -> str:
     if hasattr(request.state, 'session_id'):
@@ -47,16 +61,37 @@ def get_session_id(request: Request) -> str:
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    if ensure_schema():
+        logger.info("Database schema upgraded to version %d", SCHEMA_VERSION)
+    if settings.SESSION_BACKEND == "memory":
+        # Memory sessions died with the last process. Database sessions release their uploads when
+        # purged, and one without a row yet may still have its first upload processing on another worker.
+        released = await asyncio.to_thread(content_store.retain_sessions, await session_store.session_ids())
+        if released:
+            logger.info("Released uploads of %d sessions that no longer exist", released)
+    exercise_pool.start(lambda concept, sent: _generate_exercise_pair(
+        concept, endpoint="exercise_pool", priority=llm.Priority.BULK, sent=sent))
     try:
         yield
     finally:
+        for task in list(background_tasks):
+            task.cancel()
+        await exercise_pool.stop()
+        hashing_pool.shutdown()
+        document_parser.shutdown()
+        exercise_cache.close()
+        try:
+            await llm.aclose()
+        except Exception as e:
+            logger.debug("OpenAI client close failed: %r", e)
         try:
             engine.dispose()
+            await async_engine.dispose()
         except Exception as e:
             logger.debug("Engine dispose failed: %r",e)
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     cast(Any, CORSMiddleware),
@@ -65,31 +100,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE_BYTES)
 
-session_concepts = {}
-concept_links_by_file = {}
+background_tasks: set[asyncio.Task] = set()
+extraction_flight = SingleFlight()
+session_store.on_evict(content_store.release_session)
 
-@app.middleware("http")
-async def session_middleware(request: Request, call_next) -> Response:
-    try:
-        session_id = request.cookies.get("session_id") or secrets.token_urlsafe(32)
-        request.state.session_id = session_id
-        response = await call_next(request)
-        response.set_cookie(
-            key="session_id",
-            value=session_id,
-            httponly=True,
-            samesite="Lax",
-            secure =_is_https(request),
-            path ="/",
-        )
-        return response
+app.add_middleware(SessionMiddleware)
+app.add_middleware(ProfilingMiddleware, token=settings.PROFILING_TOKEN, sample_rate=settings.PROFILING_SAMPLE_RATE)
 
-    except Exception as e:
-        logger.exception(f"Session middleware failed: {e}")
-        request.state.session_id = DEFAULT_SESSION
-        response = await call_next(request)
-        return response
+# Added last so it is outermost and its timings include the other middlewares.
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
 
@@ -101,160 +122,558 @@ def get_public_config():
         "supportedMimeTypes": settings.SUPPORTED_MIME_TYPES
     }
 
+@app.get("/stats")
+def get_stats():
+    return {
+        "exerciseCache": exercise_cache.stats(),
+        "exercisePool": exercise_pool.stats(),
+        "llmCoalescing": llm.coalescer.stats(),
+        "llmScheduler": llm.scheduler.stats(),
+        "uploadStore": content_store.stats(),
+        "documentParser": document_parser.stats()
+    }
+
+DB_POOL_CONNECTIONS = registry.register(Gauge(
+    "db_pool_connections", "SQLAlchemy pool connections by engine and state.", ("engine", "state"),
+))
+DB_POOL_CHECKOUTS = registry.register(Counter(
+    "db_pool_checkouts_total", "Connections handed out by the SQLAlchemy pool.", ("engine",),
+))
+DB_POOL_WAITS = registry.register(Counter(
+    "db_pool_waits_total", "Checkouts that found the pool exhausted and waited for a connection.", ("engine",),
+))
+DB_POOL_WAIT_SECONDS = registry.register(Counter(
+    "db_pool_wait_seconds_total", "Time spent waiting for an exhausted pool.", ("engine",),
+))
+SESSIONS = registry.register(Gauge("sessions", "Sessions held by the session store."))
+PASSWORD_HASHES_PENDING = registry.register(Gauge(
+    "password_hashes_pending", "Password hashes running or queued in the hashing pool.",
+))
+PASSWORD_HASHES_REJECTED = registry.register(Counter(
+    "password_hashes_rejected_total", "Hash requests refused with 503 because the hashing pool was full.",
+))
+COMPONENT_EVENTS = registry.register(Counter(
+    "component_events_total", "Cache, coalescing and upload store counters from /stats.", ("component", "event"),
+))
+COMPONENT_SIZE = registry.register(Gauge(
+    "component_size", "Current size of the caches, the coalescer and the upload store.", ("component", "unit"),
+))
+
+def _collect_metrics() -> None:
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        DB_POOL_CONNECTIONS.set((name, "checked_out"), pool.checkedout())
+        DB_POOL_CONNECTIONS.set((name, "idle"), pool.checkedin())
+        DB_POOL_CONNECTIONS.set((name, "overflow"), max(0, pool.overflow()))
+        DB_POOL_CHECKOUTS.set((name,), pool.checkouts)
+        DB_POOL_WAITS.set((name,), pool.waits)
+        DB_POOL_WAIT_SECONDS.set((name,), pool.wait_seconds)
+    PASSWORD_HASHES_PENDING.set((), hashing_pool.pending)
+    PASSWORD_HASHES_REJECTED.set((), hashing_pool.rejected)
+
+    cache_stats = exercise_cache.stats()
+    for event in ("hits", "misses", "evictions"):
+        COMPONENT_EVENTS.set(("exercise_cache", event), cache_stats[event])
+    COMPONENT_SIZE.set(("exercise_cache", "entries"), cache_stats["entries"])
+    pool_stats = exercise_pool.stats()
+    for event in ("hits", "misses", "generated", "failed"):
+        COMPONENT_EVENTS.set(("exercise_pool", event), pool_stats[event])
+    for unit in ("concepts", "ready", "inflight"):
+        COMPONENT_SIZE.set(("exercise_pool", unit), pool_stats[unit])
+    coalescing_stats = llm.coalescer.stats()
+    for event in ("calls", "deduplicated"):
+        COMPONENT_EVENTS.set(("llm_coalescing", event), coalescing_stats[event])
+    COMPONENT_SIZE.set(("llm_coalescing", "inflight"), coalescing_stats["inflight"])
+    COMPONENT_SIZE.set(("llm_scheduler", "running"), llm.scheduler.running)
+    parser_stats = document_parser.stats()
+    for event in ("documents", "pages", "failed", "timeouts", "restarts"):
+        COMPONENT_EVENTS.set(("document_parser", event), parser_stats[event])
+
+registry.add_collector(_collect_metrics)
+
+def _require_profiling_token(token: str | None) -> None:
+    if settings.PROFILING_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    if not authorized(token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token.")
+
+@app.get("/profiles")
+async def list_profiles(x_profile_token: str | None = Header(default=None)) -> ORJSONResponse:
+    _require_profiling_token(x_profile_token)
+    return ORJSONResponse({"profiles": await asyncio.to_thread(profiler.store.list)})
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str,
+                      format: str = Query("json", pattern="^(json|collapsed)$"),
+                      x_profile_token: str | None = Header(default=None)) -> Response:
+    _require_profiling_token(x_profile_token)
+    profile = await asyncio.to_thread(profiler.store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    if format == "collapsed":
+        # One "frame;frame;frame count" line per stack, ready for flamegraph.pl or speedscope.
+        return PlainTextResponse("".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items()))
+    return ORJSONResponse(profile)
+
+# Reads the store's SQLite index, so it runs in a worker thread rather than as a collector.
+def _collect_store_metrics() -> None:
+    store_stats = content_store.stats()
+    for event in ("hits", "misses", "evictions"):
+        COMPONENT_EVENTS.set(("upload_store", event), store_stats[event])
+    COMPONENT_SIZE.set(("upload_store", "documents"), store_stats["documents"])
+    COMPONENT_SIZE.set(("upload_store", "bytes"), store_stats["bytes"])
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    SESSIONS.set((), await session_store.count())
+    await asyncio.to_thread(_collect_store_metrics)
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/")
 async def root() -> dict[str, str]:
     return {"message": "It's working!"}
 
 @app.get("/progress")
-async def get_progress(request: Request) -> JSONResponse:
+async def get_progress(request: Request) -> ORJSONResponse:
     session_id = get_session_id(request)
-    if session_id not in session_concepts:
-        return JSONResponse({"mastered": 0, "unmastered": 0, "total": 0})
-    concepts = session_concepts[session_id]
+    concepts = await session_store.get(session_id, "concepts")
+    if concepts is None:
+        return ORJSONResponse({"mastered": 0, "unmastered": 0, "total": 0})
     mastered = sum(1 for c in concepts.values() if c["understanding"] == 1)
     total = len(concepts)
-    return JSONResponse({
+    return ORJSONResponse({
         "mastered": mastered,
         "unmastered": total - mastered,
         "total": total
     })
 
-def extract_concepts(text: str) -> str:
-    gpt_input = text[:MAX_CONTENT_LENGTH]
-    prompt = (
-        "Extract a list of programming concepts mentioned or explained in the text below. "
-        "Return them as a comma-separated list only, with no explanations or formatting.\n\n"
-        f"{gpt_input}\n\nList:"
-    )
+@app.get("/concept-graph")
+async def get_concept_graph(request: Request,
+                            search: str = "",
+                            min_weight: int = Query(1, ge=1),
+                            offset: int = Query(0, ge=0),
+                            limit: int = Query(50, ge=1)) -> ORJSONResponse:
+    # One page of concepts, strongest first, with the edges to their top neighbours.
+    session_id = get_session_id(request)
+    concepts = await session_store.get(session_id, "concepts") or {}
+    graph = await session_store.get(session_id, "graph")
+    limit = min(limit, settings.CONCEPT_GRAPH_MAX_PAGE_SIZE)
+    needle = search.strip().lower()
+    names = [name for name in concepts if needle in name.lower()]
+    names.sort(key=lambda name: (-strength(graph, name), name))
+    page = names[offset:offset + limit]
+
+    nodes, edges, seen = [], [], set()
+    for name in page:
+        nodes.append({
+            "concept": name,
+            "understanding": concepts[name]["understanding"],
+            "strength": strength(graph, name)
+        })
+        for neighbour in related(graph, name, settings.CONCEPT_GRAPH_TOP_K, min_weight):
+            pair = (name, neighbour["concept"]) if name < neighbour["concept"] else (neighbour["concept"], name)
+            if pair not in seen:
+                seen.add(pair)
+                edges.append({"source": name, "target": neighbour["concept"], "weight": neighbour["weight"]})
+    return ORJSONResponse({
+        "nodes": nodes,
+        "edges": edges,
+        "total": len(names),
+        "offset": offset,
+        "limit": limit,
+        "nextOffset": offset + limit if offset + limit < len(names) else None
+    })
+
+@app.get("/concept-graph/related")
+async def get_related_concepts(request: Request,
+                               concept: str,
+                               limit: int = Query(5, ge=1),
+                               min_weight: int = Query(1, ge=1)) -> ORJSONResponse:
+    session_id = get_session_id(request)
+    concepts = await session_store.get(session_id, "concepts") or {}
+    if concept not in concepts:
+        raise HTTPException(status_code=404, detail="Concept not found.")
+    graph = await session_store.get(session_id, "graph")
+    return ORJSONResponse({
+        "concept": concept,
+        "related": related(graph, concept, limit, min_weight)
+    })
+
+def _new_concept() -> dict[str, Any]:
+    return {
+        "complexity": "unknown",
+        "understanding": 0,
+        "files": []
+    }
+
+# OpenAI calls that never got an answer: queued too long, refused by the open
+# circuit breaker, or past their deadline.
+LLM_UNAVAILABLE = (llm.QueueTimeout, llm.CircuitOpen, llm.DeadlineExceeded)
+
+def _unavailable(e: Exception) -> HTTPException:
+    if isinstance(e, llm.CircuitOpen):
+        return HTTPException(status_code=503, detail="AI service is temporarily unavailable, please try again later.",
+                             headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+    if isinstance(e, llm.DeadlineExceeded):
+        return HTTPException(status_code=504, detail="AI service took too long to answer, please try again.")
+    return HTTPException(status_code=503, detail="Server is busy, please try again.", headers={"Retry-After": "5"})
+
+def _spawn_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def _extract_document(job: dict[str, Any], stored: StoredUpload) -> dict[str, Any]:
+    def add_pages(count: int) -> None:
+        job["pages"] += count
+        upload_jobs.progress(job)
+
+    pages, job["parsing"] = await document_parser.parse(stored.path, stored.mime_type, add_pages)
+    content = "\n\n".join(pages)
+    if settings.EXTRACTION_MODE == "chunked":
+        concept_list, chunk_timings = await extract_concepts_chunked(pages, session_id=job["session_id"])
+    else:
+        gpt_input = await asyncio.to_thread(document_input, pages)
+        concept_list, chunk_timings = parse_concept_list(await extract_concepts(gpt_input, session_id=job["session_id"])), []
+    concept_links = await asyncio.to_thread(map_concept_links, content, concept_list)
+    # A result missing failed chunks isn't stored, so the next upload of the file tries again.
+    partial = any(timing["error"] for timing in chunk_timings)
+    if not partial:
+        await asyncio.to_thread(content_store.put_extraction, stored.sha256, extraction_key(), content,
+                                concept_list, concept_links)
+    return {"concepts": concept_list, "links": concept_links, "chunks": chunk_timings, "partial": partial}
+
+# `cached` is the stored extraction of a known document, which is used as is.
+async def _process_upload(job: dict[str, Any], stored: StoredUpload, cached: dict[str, Any] | None = None) -> None:
+    job["status"] = "processing"
+    await upload_jobs.save(job)
     try:
-        response = client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You extract programming concepts from university course material."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            timeout=10
-        )
-        return response.choices[0].message.content.strip()
+        if cached is not None:
+            result = {**cached, "chunks": [], "partial": False}
+        else:
+            # Identical documents uploaded at the same time are extracted once.
+            result = await extraction_flight.do(stored.sha256, lambda: _extract_document(job, stored))
     except Exception as e:
-        logger.error("OpenAI extraction failed: %s", e)
-        raise RuntimeError(f"OpenAI request has failed: {e}")
-
-def map_concept_links(text: str, concepts: list[str]) -> dict[str, dict[str, int]]:
-    concept_links = defaultdict(lambda: defaultdict(int))
-    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-    for paragraph in paragraphs:
-        found = [c for c in concepts if c.lower() in paragraph.lower()]
-        for a, b in itertools.combinations(set(found), 2):
-            concept_links[a][b] += 1
-            concept_links[b][a] += 1
-    return {k: dict(v) for k, v in concept_links.items()}
-
-# @app.post("/upload")
-# async def handle_file_upload(request: Request, file: UploadFile = File(...)):
-#     session_id = get_session_id(request)
-#     save_path = os.path.join(settings.UPLOAD_DIR, file.filename)
-#     with open(save_path, "wb") as out_file:
-#         shutil.copyfileobj(file.file, out_file)
-#     try:
-#         if file.filename.endswith(".txt"):
-#             with open(save_path, "r", encoding="utf-8") as f:
-#                 content = f.read()
-#         else:
-#             content = textract.process(save_path).decode("utf-8")
-#         concept_string = extract_concepts(content)
-#     except Exception as e:
-#         return JSONResponse({
-#             "filename": file.filename,
-#             "message": "File has been saved, but concepts couldn't be extracted!",
-#             "error": repr(e),
-#             "trace": traceback.format_exc()
-#         })
-#     concept_list = [c.strip() for c in concept_string.split(",") if c.strip()]
-#     session_concepts.setdefault(session_id, {})
-#     for concept in concept_list:
-#         concept_data = session_concepts[session_id].setdefault(concept, {
-#             "complexity": "unknown",
-#             "understanding": 0,
-#             "files": []
-#         })
-#         if file.filename not in concept_data["files"]:
-#             concept_data["files"].append(file.filename)
-#     concept_links = map_concept_links (content, concept_list)
-#     concept_links_by_file[file.filename] = concept_links
-#     return JSONResponse({
-#         "filename": file.filename,
-#         "message": "File has been uploaded and processed!",
-#         "concepts": concept_list
-#     })
+        logger.error("Processing upload %s failed: %r", stored.filename, e)
+        await upload_jobs.finish(job, "failed", error="File has been saved, but concepts couldn't be extracted!")
+        return
+
+    session_id = job["session_id"]
+    concept_list = result["concepts"]
+
+    def add_concepts(concepts: dict[str, Any]) -> dict[str, Any]:
+        for concept in concept_list:
+            concept_data = concepts.setdefault(concept, _new_concept())
+            if stored.filename not in concept_data["files"]:
+                concept_data["files"].append(stored.filename)
+        return concepts
+
+    def add_links(graph: dict[str, Any] | None) -> dict[str, Any]:
+        return merge_file_links(graph, stored.filename, result["links"], settings.CONCEPT_GRAPH_TOP_K)
+
+    await session_store.update(session_id, "concepts", add_concepts, default={})
+    await session_store.update(session_id, "graph", add_links)
+    if result["partial"]:
+        await upload_jobs.finish(job, "partial", concepts=concept_list, chunks=result["chunks"],
+                                 error="Some parts of the file couldn't be analysed; upload it again to retry them.")
+    else:
+        await upload_jobs.finish(job, "done", concepts=concept_list, chunks=result["chunks"])
+    exercise_pool.want(concept_list)
+
+@app.post("/upload", status_code=202)
+async def handle_file_upload(request: Request) -> ORJSONResponse:
+    session_id = get_session_id(request)
+    stored = await receive_upload(request, settings.UPLOAD_DIR)
+    extension = os.path.splitext(stored.filename)[1].lower()
+    stored.path = await asyncio.to_thread(content_store.adopt, stored.path, stored.sha256, extension, stored.size,
+                                          session_id, stored.filename)
+    job = await upload_jobs.create(session_id, stored.filename)
+    cached = await asyncio.to_thread(content_store.get_extraction, stored.sha256, extraction_key())
+    if cached is not None:
+        # Known document: no LLM call needed, so answer with the finished job right away.
+        await _process_upload(job, stored, cached)
+        return ORJSONResponse({
+            "job_id": job["job_id"],
+            "filename": stored.filename,
+            "status": job["status"],
+            "concepts": job["concepts"],
+            "message": "File has been uploaded and processed!"
+        })
+    _spawn_background(_process_upload(job, stored))
+    return ORJSONResponse({
+        "job_id": job["job_id"],
+        "filename": stored.filename,
+        "status": job["status"],
+        "message": "File has been uploaded and is being processed."
+    }, status_code=202)
+
+@app.get("/upload/{job_id}")
+async def get_upload_status(request: Request, job_id: str) -> ORJSONResponse:
+    job = await upload_jobs.get(job_id)
+    if job is None or job["session_id"] != get_session_id(request):
+        raise HTTPException(status_code=404, detail="Upload job not found.")
+    return ORJSONResponse(upload_jobs.public(job))
 
 @app.post("/mark")
 async def mark_concept_as_mastered(request: Request, payload: MasterConcept) -> dict[str, str]:
     session_id = get_session_id(request)
     concept = payload.concept
-    if session_id not in session_concepts:
-        raise HTTPException(status_code=404, detail="Session not found.")
-    if concept not in session_concepts[session_id]:
-        raise HTTPException(status_code=404, detail="Concept not found.")
-    session_concepts[session_id][concept]["understanding"] = 1
+
+    def mark(concepts: dict[str, Any] | None) -> dict[str, Any]:
+        if concepts is None:
+            raise HTTPException(status_code=404, detail="Session not found.")
+        if concept not in concepts:
+            raise HTTPException(status_code=404, detail="Concept not found.")
+        concepts[concept]["understanding"] = 1
+        return concepts
+
+    await session_store.update(session_id, "concepts", mark)
     return {"message": f"{concept} has been marked as mastered."}
 
-@app.post("/generate-exercise")
-async def generate_exercise(request: Request, payload: ExerciseRequest) -> JSONResponse:
+def _unique_concepts(concepts: list[str]) -> list[str]:
+    unique = list(dict.fromkeys(c.strip() for c in concepts if c.strip()))
+    if not unique:
+        raise HTTPException(status_code=400, detail="No concepts given.")
+    if len(unique) > settings.EXERCISE_BATCH_MAX_CONCEPTS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.EXERCISE_BATCH_MAX_CONCEPTS} concepts per request.")
+    return unique
+
+@app.post("/mark/batch")
+async def mark_concepts_as_mastered(request: Request, payload: MasterConceptBatch) -> dict[str, Any]:
     session_id = get_session_id(request)
-    concept = payload.concept
+    requested = _unique_concepts([item.concept for item in payload.concepts])
+    marked, missing = [], []
+
+    def mark(concepts: dict[str, Any] | None) -> dict[str, Any]:
+        if concepts is None:
+            raise HTTPException(status_code=404, detail="Session not found.")
+        for concept in requested:
+            if concept in concepts:
+                concepts[concept]["understanding"] = 1
+                marked.append(concept)
+            else:
+                missing.append(concept)
+        return concepts
+
+    await session_store.update(session_id, "concepts", mark)
+    return {
+        "message": f"{len(marked)} of {len(requested)} concepts have been marked as mastered.",
+        "marked": marked,
+        "not_found": missing
+    }
+
+def _exercise_messages(concept: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": "You help students learn programming by generating exercises."},
+        {"role": "user", "content": EXERCISE_PROMPT_TEMPLATE.format(concept=concept)}
+    ]
+
+def _solution_messages(concept: str, exercise: str, solution: str) -> list[dict[str, str]]:
     prompt = (
-        f"Generate a beginner-friendly coding exercise for the concept: {concept}. "
-        f"Keep it short. Then provide a hint. Format it like this:\n\n"
-        f"Exercise:\n<exercise>\n\nHint:\n<hint>"
+        f"You're an AI tutor. Here's a student's solution to a programming exercise about '{concept}'.\n"
+        f"Exercise:\n{exercise}\n\nStudent's solution:\n{solution}\n\n"
+        f"Evaluate the correctness of the solution. Respond with a short explanation and suggestion if needed."
     )
+    return [
+        {"role": "system", "content": "You evaluate student code and provide constructive feedback."},
+        {"role": "user", "content": prompt}
+    ]
+
+async def _remember_exercise(session_id: str, concept: str, exercise: str, hint: str) -> None:
+    def remember(concepts: dict[str, Any]) -> dict[str, Any]:
+        concept_data = concepts.setdefault(concept, _new_concept())
+        concept_data["exercise"] = exercise
+        concept_data["hint"] = hint
+        return concepts
+
+    await session_store.update(session_id, "concepts", remember, default={})
+
+def _exercise_batch_messages(concepts: list[str]) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": "You help students learn programming by generating exercises."},
+        {"role": "user", "content": EXERCISE_BATCH_PROMPT_TEMPLATE.format(concepts="\n".join(f"- {c}" for c in concepts))}
+    ]
+
+async def _generate_exercise_group(concepts: list[str], session_id: str) -> dict[str, tuple[str, str] | str]:
+    # One completion for the whole group; concepts the model skipped or garbled get an error message.
     try:
-        response = client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You help students learn programming by generating exercises."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5
-        )
-        content = response.choices[0].message.content
-        exercise_text = content.strip()
+        content = await llm.complete(_exercise_batch_messages(concepts), temperature=0.5,
+                                     endpoint="generate_exercise_batch", json_mode=True, session_id=session_id)
+        with span("postprocess"):
+            answer = json.loads(content)
+        if not isinstance(answer, dict):
+            raise ValueError("expected a JSON object")
+    except LLM_UNAVAILABLE as e:
+        return {concept: _unavailable(e).detail for concept in concepts}
+    except Exception as e:
+        logger.error("OpenAI batch exercise request for %d concepts failed: %r", len(concepts), e)
+        return {concept: "OpenAI request failed" for concept in concepts}
+
+    results: dict[str, tuple[str, str] | str] = {}
+    for concept in concepts:
+        entry = answer.get(concept)
+        if (isinstance(entry, dict) and isinstance(entry.get("exercise"), str) and entry["exercise"].strip()
+                and isinstance(entry.get("hint"), str)):
+            results[concept] = (entry["exercise"].strip(), entry["hint"].strip())
+        else:
+            results[concept] = "Missing from the model response"
+    return results
+
+async def _generate_exercise_pair(concept: str,
+                                  endpoint: str = "generate_exercise",
+                                  priority: llm.Priority = llm.Priority.GENERATION,
+                                  session_id: str = "",
+                                  sent: asyncio.Event | None = None) -> tuple[str, str]:
+    content = await llm.complete(_exercise_messages(concept), temperature=0.5,
+                                 endpoint=endpoint, priority=priority, session_id=session_id, sent=sent)
+    with span("postprocess"):
+        parser = ExerciseStreamParser()
+        parser.feed(content)
+        parser.close()
+    return parser.exercise, parser.hint
+
+async def _stream_exercise(session_id: str, concept: str, cache_key: str) -> AsyncIterator[str]:
+    cached = await exercise_pool.get(concept) or await exercise_cache.get(cache_key)
+    if cached is not None:
+        exercise, hint = cached
+        yield sse_event("exercise", {"text": exercise})
+        yield sse_event("hint", {"text": hint})
+    else:
+        parser = ExerciseStreamParser()
+        try:
+            async for delta in llm.stream(_exercise_messages(concept), temperature=0.5,
+                                          endpoint="generate_exercise", session_id=session_id):
+                for section, text in parser.feed(delta):
+                    yield sse_event(section, {"text": text})
+            for section, text in parser.close():
+                yield sse_event(section, {"text": text})
+        except LLM_UNAVAILABLE as e:
+            yield sse_event("error", {"detail": _unavailable(e).detail})
+            return
+        except Exception as e:
+            logger.error("OpenAI generate exercise stream failed: %r", e)
+            yield sse_event("error", {"detail": "OpenAI request failed"})
+            return
+        exercise, hint = parser.exercise, parser.hint
+        exercise_cache.put(cache_key, exercise, hint)
+    await _remember_exercise(session_id, concept, exercise, hint)
+    exercise_pool.want([concept])
+    yield sse_event("done", {"exercise": exercise, "hint": hint})
 
-        match = exercise_text.split("\n\n")
-        exercise = match[0].replace("Exercise:", "").strip()
-        hint = match[1].replace("Hint:", "").strip()
+async def _stream_feedback(session_id: str, messages: list[dict[str, str]]) -> AsyncIterator[str]:
+    parts = []
+    try:
+        async for delta in llm.stream(messages, temperature=0.3, endpoint="check_solution",
+                                      priority=llm.Priority.INTERACTIVE, session_id=session_id):
+            parts.append(delta)
+            yield sse_event("feedback", {"text": delta})
+    except LLM_UNAVAILABLE as e:
+        yield sse_event("error", {"detail": _unavailable(e).detail})
+        return
+    except Exception as e:
+        logger.error("OpenAI check solution stream failed: %r", e)
+        yield sse_event("error", {"detail": "Upstream AI call failed"})
+        return
+    yield sse_event("done", {"feedback": "".join(parts).strip()})
 
-        if session_id not in session_concepts:
-            session_concepts[session_id] = {}
-        session_concepts[session_id][concept] = session_concepts[session_id].get(concept, {})
-        session_concepts[session_id][concept]["exercise"] = exercise
-        session_concepts[session_id][concept]["hint"] = hint
-        return JSONResponse({"exercise": exercise, "hint": hint})
+@app.post("/generate-exercise")
+async def generate_exercise(request: Request, payload: ExerciseRequest) -> Response:
+    session_id = get_session_id(request)
+    concept = payload.concept
+    cache_key = exercise_cache.make_key(settings.OPENAI_MODEL, concept, EXERCISE_PROMPT_VERSION)
+    if payload.stream:
+        return StreamingResponse(
+            _stream_exercise(session_id, concept, cache_key),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+    try:
+        cached = await exercise_pool.get(concept) or await exercise_cache.get(cache_key)
+        if cached is not None:
+            exercise, hint = cached
+        else:
+            exercise, hint = await _generate_exercise_pair(concept, session_id=session_id)
+            exercise_cache.put(cache_key, exercise, hint)
+
+        await _remember_exercise(session_id, concept, exercise, hint)
+        # Asked for after the live call, so the refill doesn't coalesce with it and repeat the same exercise.
+        exercise_pool.want([concept])
+        return ORJSONResponse({"exercise": exercise, "hint": hint})
 
+    except LLM_UNAVAILABLE as e:
+        raise _unavailable(e)
     except Exception as e:
         logger.error("OpenAI generate exercise request failed: %r", e)
         raise HTTPException(status_code=500, detail="OpenAI request failed")
+@app.post("/generate-exercise/batch")
+async def generate_exercises(request: Request, payload: ExerciseBatchRequest) -> ORJSONResponse:
+    session_id = get_session_id(request)
+    concepts = _unique_concepts(payload.concepts)
+    exercises: dict[str, tuple[str, str]] = {}
+    sources: dict[str, str] = {}
+    pending: list[str] = []
+    for concept in concepts:
+        pair = await exercise_pool.get(concept)
+        source = "pool"
+        if pair is None:
+            pair = await exercise_cache.get(exercise_cache.make_key(settings.OPENAI_MODEL, concept, EXERCISE_PROMPT_VERSION))
+            source = "cache"
+        if pair is None:
+            pending.append(concept)
+        else:
+            exercises[concept], sources[concept] = pair, source
+
+    size = settings.EXERCISE_BATCH_GROUP_SIZE
+    groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+    errors: dict[str, str] = {}
+    for group_results in await asyncio.gather(*(_generate_exercise_group(group, session_id) for group in groups)):
+        for concept, result in group_results.items():
+            if isinstance(result, str):
+                errors[concept] = result
+                continue
+            exercises[concept], sources[concept] = result, "generated"
+            exercise_cache.put(exercise_cache.make_key(settings.OPENAI_MODEL, concept, EXERCISE_PROMPT_VERSION), *result)
+
+    def remember(session_concepts: dict[str, Any]) -> dict[str, Any]:
+        for concept, (exercise, hint) in exercises.items():
+            concept_data = session_concepts.setdefault(concept, _new_concept())
+            concept_data["exercise"] = exercise
+            concept_data["hint"] = hint
+        return session_concepts
+
+    if exercises:
+        await session_store.update(session_id, "concepts", remember, default={})
+    exercise_pool.want(concepts)
+
+    results = []
+    for concept in concepts:
+        if concept in exercises:
+            exercise, hint = exercises[concept]
+            results.append({"concept": concept, "exercise": exercise, "hint": hint, "source": sources[concept]})
+        else:
+            results.append({"concept": concept, "error": errors[concept]})
+    return ORJSONResponse({
+        "results": results,
+        "generated": len(pending) - len(errors),
+        "failed": len(errors),
+        "completions": len(groups)
+    })
+
 @app.post("/check-solution")
-async def evaluate_solution(payload: SolutionSubmission) -> JSONResponse:
-    concept = payload.concept
-    exercise = payload.exercise
-    solution = payload.solution
-    prompt = (
-        f"You're an AI tutor. Here's a student's solution to a programming exercise about '{concept}'.\n"
-        f"Exercise:\n{exercise}\n\nStudent's solution:\n{solution}\n\n"
-        f"Evaluate the correctness of the solution. Respond with a short explanation and suggestion if needed."
-    )
-    try:
-        response = client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You evaluate student code and provide constructive feedback."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
+async def evaluate_solution(request: Request, payload: SolutionSubmission) -> Response:
+    session_id = get_session_id(request)
+    messages = _solution_messages(payload.concept, payload.exercise, payload.solution)
+    if payload.stream:
+        return StreamingResponse(
+            _stream_feedback(session_id, messages),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
         )
-        return JSONResponse({"feedback": response.choices[0].message.content.strip()})
+    try:
+        content = await llm.complete(messages, temperature=0.3, endpoint="check_solution",
+                                     priority=llm.Priority.INTERACTIVE, session_id=session_id)
+        return ORJSONResponse({"feedback": content.strip()})
+    except LLM_UNAVAILABLE as e:
+        raise _unavailable(e)
     except Exception as e:
         logger.exception("OpenAI check solution request failed: %r", e)
-        raise HTTPException(status_code=502, detail="Upstream AI call failed")
\ No newline at end of file
+        raise HTTPException(status_code=502, detail="Upstream AI call failed")
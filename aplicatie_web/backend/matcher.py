@@ -0,0 +1,91 @@
+# Standard library imports
+import itertools
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+__all__ = [
+    "ConceptMatcher",
+    "tokenize",
+]
+
+# Words and single punctuation marks, so "C++" is ("c", "+", "+") and "for  loop" is ("for", "loop").
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+# Aho-Corasick automaton over word tokens instead of characters. Matching whole
+# tokens makes it word-boundary aware ("loop" doesn't match inside "loops") and
+# lets the regex tokenizer do the per-character work in C. Each paragraph is
+# scanned once, whatever the number of concepts.
+class ConceptMatcher:
+    def __init__(self, concepts: Iterable[str]):
+        self.concepts: List[str] = list(dict.fromkeys(concepts))
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for index, concept in enumerate(self.concepts):
+            node = 0
+            tokens = tokenize(concept)
+            if not tokens:
+                continue
+            for token in tokens:
+                child = goto[node].get(token)
+                if child is None:
+                    child = len(goto)
+                    goto[node][token] = child
+                    goto.append({})
+                    out.append([])
+                node = child
+            out[node].append(index)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and token not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(token, 0)
+                fail[child] = target if target != child else 0
+                out[child].extend(out[fail[child]])
+
+        self._goto = goto
+        self._fail = fail
+        self._out: List[Tuple[int, ...]] = [tuple(o) for o in out]
+
+    def find(self, text: str) -> Set[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[int] = set()
+        node = 0
+        for token in tokenize(text):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def cooccurrences(self, paragraphs: Iterable[str]) -> Dict[int, int]:
+        # Sparse upper-triangle counts: pair (a, b) with a < b is stored under a * n + b.
+        n = len(self.concepts)
+        counts: Dict[int, int] = {}
+        for paragraph in paragraphs:
+            found = self.find(paragraph)
+            if len(found) < 2:
+                continue
+            for a, b in itertools.combinations(sorted(found), 2):
+                key = a * n + b
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def links(self, paragraphs: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        n = len(self.concepts)
+        concept_links: Dict[str, Dict[str, int]] = {}
+        for key, count in self.cooccurrences(paragraphs).items():
+            a, b = self.concepts[key // n], self.concepts[key % n]
+            concept_links.setdefault(a, {})[b] = count
+            concept_links.setdefault(b, {})[a] = count
+        return concept_links
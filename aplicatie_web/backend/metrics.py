@@ -0,0 +1,212 @@
+# Standard library imports
+import bisect
+import math
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "registry",
+    "MetricsMiddleware",
+    "CONTENT_TYPE",
+    "HTTP_REQUEST_SECONDS",
+    "HTTP_REQUESTS_IN_FLIGHT",
+    "LLM_REQUEST_SECONDS",
+    "LLM_REQUESTS_IN_FLIGHT",
+    "LLM_ERRORS",
+    "LLM_TOKENS",
+    "LLM_QUEUE_DEPTH",
+    "LLM_QUEUE_WAIT_SECONDS",
+    "LLM_QUEUE_DROPPED",
+    "LLM_CIRCUIT_STATE",
+    "LLM_RETRIES",
+    "LLM_HEDGES",
+]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUEUE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+# Minimal Prometheus text-format metrics. Series are keyed by a tuple of label
+# values in `labelnames` order, so recording a sample costs a dict lookup and an
+# addition; the text is only built when /metrics is scraped.
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _label_text(self, labels: Labels, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type}\n"
+        return header + "".join(f"{line}\n" for line in self.samples())
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, labels: Labels, value: float) -> None:
+        # For totals that are counted elsewhere (cache hits, pool checkouts) and copied at scrape time.
+        self._values[labels] = value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._label_text(labels)} {_format_value(value)}" for labels, value in self._values.items()]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: one count per bucket plus +Inf, then the sum of observed values.
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), series):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        # Collectors run right before rendering and copy current values into gauges.
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        return "".join(metric.render() for metric in self._metrics)
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, method and status.",
+    ("route", "method", "status"),
+))
+HTTP_REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ("method",),
+))
+LLM_REQUEST_SECONDS = registry.register(Histogram(
+    "llm_request_duration_seconds", "OpenAI call latency by calling endpoint, excluding time queued locally.",
+    ("endpoint",), buckets=LLM_BUCKETS,
+))
+LLM_REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "llm_requests_in_flight", "OpenAI calls currently waiting for a response.", ("endpoint",),
+))
+LLM_ERRORS = registry.register(Counter(
+    "llm_errors_total", "Failed OpenAI calls by calling endpoint and exception type.", ("endpoint", "error"),
+))
+LLM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "Tokens reported in OpenAI response usage, by calling endpoint and kind.", ("endpoint", "kind"),
+))
+LLM_QUEUE_DEPTH = registry.register(Gauge(
+    "llm_queue_depth", "OpenAI calls waiting in the scheduler, by priority class.", ("priority",),
+))
+LLM_QUEUE_WAIT_SECONDS = registry.register(Histogram(
+    "llm_queue_wait_seconds", "Time OpenAI calls spent queued before being admitted, by priority class.",
+    ("priority",), buckets=QUEUE_BUCKETS,
+))
+LLM_QUEUE_DROPPED = registry.register(Counter(
+    "llm_queue_dropped_total", "OpenAI calls that left the queue without running, by priority class and reason.",
+    ("priority", "reason"),
+))
+LLM_CIRCUIT_STATE = registry.register(Gauge(
+    "llm_circuit_state", "OpenAI circuit breaker state: 0 closed, 1 half-open, 2 open.",
+))
+LLM_RETRIES = registry.register(Counter(
+    "llm_retries_total", "OpenAI calls retried, by calling endpoint and the error that caused the retry.",
+    ("endpoint", "error"),
+))
+LLM_HEDGES = registry.register(Counter(
+    "llm_hedges_total", "Hedged second OpenAI requests sent, and how many of them answered first.",
+    ("endpoint", "outcome"),
+))
+
+# Pure ASGI middleware: it times the whole response, streaming bodies included,
+# and labels it with the matched route template (`/upload/{job_id}`, not the raw
+# path) so the number of series stays bounded.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        method = scope["method"]
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec((method,))
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe((route, method, str(status)), time.perf_counter() - started)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, JSON, func
 from database import Base
 
 class User(Base):
@@ -7,4 +7,19 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SessionState(Base):
+    __tablename__ = "session_state"
+
+    session_id = Column(String(64), primary_key=True)
+    key = Column(String(32), primary_key=True)
+    value = Column(JSON, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+
+    job_id = Column(String(32), primary_key=True)
+    session_id = Column(String(64), nullable=False)
+    state = Column(JSON, nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True, index=True)
@@ -0,0 +1,253 @@
+# Standard library imports
+import logging
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, List, Optional, Set
+
+try:
+    import tiktoken
+except ImportError:  # optional: without it token counts are estimated
+    tiktoken = None
+
+# Local imports
+from config import settings
+from matcher import tokenize
+
+__all__ = [
+    "Paragraph",
+    "count_tokens",
+    "split_paragraphs",
+    "score_paragraphs",
+    "pack",
+    "pack_chunks",
+]
+
+logger = logging.getLogger(__name__)
+
+PARAGRAPH_CHARS = 800  # PDF pages have no blank lines: lines are grouped into paragraphs of about this size
+CODE_WEIGHT = 0.5  # score of one code-like token; capped per paragraph so a listing can't outrank prose
+MAX_CODE_MARKERS = 10
+BOILERPLATE_PENALTY = 3.0
+NEIGHBOUR_WEIGHT = 0.25  # explanations run over several paragraphs: share of the best neighbour's score on the page
+MIN_SCORE = 2.0  # below this a paragraph is front matter or administrative text and is never sent
+REPEATED_LINE_PAGES = 3  # a line on at least this many pages (and half of them) is a running header or footer
+
+# Programming vocabulary matched as token prefixes, so one stem covers plurals and the
+# Romanian inflections of course material ("funcți" matches "funcția", "funcții").
+LEXICON_STEMS = frozenset("""
+    algorithm algoritm abstract abstractiz address adres aggregat alloc aloc argument arbor array assert
+    async await atribu backtrack binar bitwise boolean branch breadth buffer bucl callback cast catch char
+    closure compil complexit concaten concurren condiți constant construct constructor container
+    coroutin cursor deadlock declar decorator default delegat depth dereferenț destructor dictionar
+    dictionary dynamic dinamic encapsul enumer excepți exception expresi expression fibonacci field fișier
+    float framework funcți function functor generic generator getter graph graf greedy handler hash heap
+    implement increment index inherit inițializ initializ inline input instanț instance instrucțiun instruction
+    integer interfaț interface interpret iterat iterator javascript kernel lambda linked liniar linear list
+    literal loop malloc matric matrix memor memory mergesort method metod module mutex namespace node
+    nod null numpy object obiect operand operator optimiz output overflow overload overrid packag parameter
+    parametr pars pattern pointer polimorf polymorph procedur process proces python queue
+    recurs referenc referinț regex registr return scope semafor semaphor serializ setter signature sintax
+    socket sort sortar stack static stiv string struct subclas subrout switch syntax templat thread tipul
+    tipuri token traversal travers tree tupl typedef unsigned variab vector virtual void
+""".split())
+# Short words that would match too much as prefixes. Keywords that are also everyday
+# words ("for", "if", "while") are left to the code-like token signal.
+LEXICON_WORDS = frozenset("""
+    api ast bfs bst cpu css dfs dom gcc git gpu html http int jit json jvm lifo fifo oop ram sql stl tcp udp
+    uml xml yaml elif def const enum bool byte char dict push pop stdio iostream
+    class classes subclass clasa clasă clase clasei claselor subclasă
+""".split())
+# Everyday words that start like a stem ("obiective" is "objectives", not objects).
+LEXICON_EXCLUDED = ("obiectiv", "instructor", "assignment", "structured")
+_STEM_LENGTHS = sorted({len(stem) for stem in LEXICON_STEMS})
+
+_CODE_RE = re.compile(
+    r"[{};]|[=!<>]=|->|=>|::|\+\+|&&|\|\||#include|\b\w+(?:\(\)|\[\w*\])|\b(?:\w+_\w+|[a-z]+[A-Z]\w*)"
+)
+_TOC_LINE_RE = re.compile(r"(?:\.\s*){4,}\d+\s*$")  # "2.1 Pointers ........ 14"
+BOILERPLATE_WORDS = frozenset(("copyright", "©", "isbn", "cuprins", "bibliografie", "bibliography", "references"))
+BOILERPLATE_PHRASES = ("all rights reserved", "toate drepturile rezervate", "table of contents")
+_DIGITS_RE = re.compile(r"\d+")
+_SENTENCE_END = (".", "!", "?", ":", ";")
+
+_encoding = None
+_encoding_failed = False
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and tiktoken is not None:
+        try:
+            try:
+                _encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # the BPE file is downloaded on first use and may be unreachable
+            _encoding_failed = True
+            logger.warning("tiktoken encoding unavailable, estimating token counts: %r", e)
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # BPE keeps common words whole and splits long or inflected ones every few characters.
+    return sum(1 + (len(token) - 1) // 5 for token in tokenize(text))
+
+class Paragraph:
+    __slots__ = ("index", "page", "text", "tokens", "terms", "code_markers", "boilerplate", "score")
+
+    def __init__(self, index: int, page: int, text: str):
+        self.index = index  # position in the document, to restore reading order after ranking
+        self.page = page
+        self.text = text
+        self.tokens = count_tokens(text)
+        self.terms: Set[str] = set()
+        self.code_markers = 0
+        self.boilerplate = False
+        self.score = 0.0
+
+def _split_line(line: str, max_chars: int) -> List[str]:
+    pieces, current = [], ""
+    for word in line.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {word}" if current else word[:max_chars]
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _line_key(line: str) -> str:
+    # Page numbers change from page to page, the footer around them doesn't.
+    return _DIGITS_RE.sub("#", line.strip())
+
+def _repeated_lines(pages: List[str]) -> Set[str]:
+    if len(pages) < REPEATED_LINE_PAGES:
+        return set()
+    seen = Counter(key for page in pages for key in {_line_key(line) for line in page.splitlines()} if key)
+    threshold = max(REPEATED_LINE_PAGES, len(pages) // 2)
+    return {key for key, pages_with_line in seen.items() if pages_with_line >= threshold}
+
+def split_paragraphs(pages: List[str], max_chars: int = PARAGRAPH_CHARS) -> List[Paragraph]:
+    # Blank lines always end a paragraph. Inside a block, lines are joined until the
+    # paragraph is at least half of `max_chars` and a line ends a sentence (or is short,
+    # like a heading), or until the next line would overflow it. Running headers and
+    # footers (lines repeated on most pages) are dropped first.
+    repeated = _repeated_lines(pages)
+    paragraphs: List[Paragraph] = []
+
+    def add(number: int, text: str) -> None:
+        paragraphs.append(Paragraph(len(paragraphs), number, text))
+
+    for number, page in enumerate(pages):
+        for block in page.split("\n\n"):
+            current = ""
+            for line in block.splitlines():
+                line = line.strip()
+                if not line or _line_key(line) in repeated:
+                    continue
+                for piece in ([line] if len(line) <= max_chars else _split_line(line, max_chars)):
+                    if current and len(current) + 1 + len(piece) > max_chars:
+                        add(number, current)
+                        current = ""
+                    current = f"{current}\n{piece}" if current else piece
+                if len(current) >= max_chars // 2 and (line.endswith(_SENTENCE_END) or len(line) < 40):
+                    add(number, current)
+                    current = ""
+            if current:
+                add(number, current)
+    return paragraphs
+
+@lru_cache(maxsize=65536)
+def _lexicon_term(token: str) -> Optional[str]:
+    # Course text repeats the same few thousand words, so each is looked up once.
+    if token in LEXICON_WORDS:
+        return token
+    if token.startswith(LEXICON_EXCLUDED):
+        return None
+    for length in _STEM_LENGTHS:
+        if length > len(token):
+            break
+        if token[:length] in LEXICON_STEMS:
+            return token[:length]
+    return None
+
+def _lexicon_terms(tokens: Set[str]) -> Set[str]:
+    terms = set(map(_lexicon_term, tokens))
+    terms.discard(None)
+    return terms
+
+def _looks_like_front_matter(text: str, tokens: Set[str]) -> bool:
+    if not BOILERPLATE_WORDS.isdisjoint(tokens):
+        return True
+    lowered = text.lower()
+    return any(phrase in lowered for phrase in BOILERPLATE_PHRASES)
+
+def score_paragraphs(paragraphs: List[Paragraph]) -> List[Paragraph]:
+    # TF-IDF against the lexicon, with binary term frequency: a paragraph earns the inverse
+    # document frequency of every lexicon term it contains, so terms on every page (the
+    # course title) count little and the specific ones count most. Code-like tokens add to
+    # it, and so does a share of the best neighbouring paragraph on the same page. Tables of
+    # contents and number tables score zero; copyright notices and reference lists are penalised.
+    token_sets = [set(tokenize(paragraph.text)) for paragraph in paragraphs]
+    for paragraph, tokens in zip(paragraphs, token_sets):
+        paragraph.terms = _lexicon_terms(tokens)
+        paragraph.code_markers = min(len(_CODE_RE.findall(paragraph.text)), MAX_CODE_MARKERS)
+        lines = paragraph.text.splitlines()
+        toc_lines = sum(1 for line in lines if line[-1:].isdigit() and _TOC_LINE_RE.search(line))
+        digits = sum(map(len, _DIGITS_RE.findall(paragraph.text)))
+        paragraph.boilerplate = toc_lines * 2 >= len(lines) or digits > 0.3 * len(paragraph.text)
+
+    document_frequency = Counter(term for paragraph in paragraphs for term in paragraph.terms)
+    count = len(paragraphs)
+    own = []
+    for paragraph, tokens in zip(paragraphs, token_sets):
+        score = sum(math.log(count / document_frequency[term]) + 1 for term in paragraph.terms)
+        score += CODE_WEIGHT * paragraph.code_markers
+        if _looks_like_front_matter(paragraph.text, tokens):
+            score -= BOILERPLATE_PENALTY
+        own.append(0.0 if paragraph.boilerplate else max(score, 0.0))
+    for i, paragraph in enumerate(paragraphs):
+        if paragraph.boilerplate:
+            continue
+        neighbours = max([own[j] for j in (i - 1, i + 1) if 0 <= j < count and paragraphs[j].page == paragraph.page],
+                         default=0.0)
+        paragraph.score = own[i] + NEIGHBOUR_WEIGHT * neighbours
+    return paragraphs
+
+def _select(paragraphs: List[Paragraph], budget: int) -> List[Paragraph]:
+    # Greedy knapsack: best score per token first, then back to reading order.
+    candidates = sorted((p for p in paragraphs if p.score >= MIN_SCORE),
+                        key=lambda p: (-p.score / max(p.tokens, 1), p.index))
+    selected, used = [], 0
+    for paragraph in candidates:
+        if used + paragraph.tokens <= budget:
+            selected.append(paragraph)
+            used += paragraph.tokens
+    return sorted(selected, key=lambda p: p.index)
+
+def pack(pages: Iterable[str], budget: int) -> str:
+    # The most concept-dense paragraphs of the document that fit in `budget` tokens.
+    paragraphs = score_paragraphs(split_paragraphs(list(pages)))
+    return "\n\n".join(p.text for p in _select(paragraphs, budget))
+
+def pack_chunks(pages: Iterable[str], chunk_budget: int, max_chunks: Optional[int] = None) -> List[str]:
+    # Paragraphs scoring below MIN_SCORE are dropped; the rest are cut into chunks of at most
+    # `chunk_budget` tokens in reading order. When they hold more than `max_chunks` chunks'
+    # worth of tokens, the lowest scoring paragraphs are left out.
+    paragraphs = score_paragraphs(split_paragraphs(list(pages)))
+    capacity = chunk_budget * max_chunks if max_chunks is not None else sum(p.tokens for p in paragraphs)
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+    for paragraph in _select(paragraphs, capacity):
+        if current and used + paragraph.tokens > chunk_budget:
+            chunks.append("\n\n".join(current))
+            current, used = [], 0
+        current.append(paragraph.text)
+        used += paragraph.tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
@@ -0,0 +1,246 @@
+# Standard library imports
+import asyncio
+import codecs
+import multiprocessing
+import signal
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Local imports
+from config import settings
+
+__all__ = [
+    "MIME_PDF",
+    "MIME_DOC",
+    "MIME_DOCX",
+    "MIME_TEXT",
+    "PARSEABLE_MIME_TYPES",
+    "ParserTimeout",
+    "DocumentParser",
+    "document_parser",
+    "iter_page_texts",
+]
+
+MIME_PDF = "application/pdf"
+MIME_DOC = "application/msword"
+MIME_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MIME_TEXT = "text/plain"
+PARSEABLE_MIME_TYPES = (MIME_PDF, MIME_DOCX, MIME_TEXT)  # MIME_DOC is recognised but has no text extractor
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Extra seconds the web worker waits past the time limit before it gives up on a
+# task stuck in native code and replaces the worker processes.
+KILL_GRACE_SECONDS = 5
+
+class ParserTimeout(Exception):
+    pass
+
+# --- Text extraction ---
+def iter_page_texts(path: str, mime_type: str) -> Iterator[str]:
+    if mime_type == MIME_PDF:
+        import pymupdf
+        with pymupdf.open(path) as document:
+            for page in document:
+                yield page.get_text()
+    elif mime_type == MIME_DOCX:
+        yield from _iter_docx_texts(path)
+    elif mime_type == MIME_TEXT:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(path, "rb") as f:
+            while block := f.read(1024 * 1024):
+                yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+    else:
+        raise ValueError(f"Text extraction is not supported for '{mime_type}' files.")
+
+def _iter_docx_texts(path: str, paragraphs_per_page: int = 50) -> Iterator[str]:
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as xml:
+        paragraphs: List[str] = []
+        for _, element in ElementTree.iterparse(xml, events=("end",)):
+            if element.tag != f"{WORD_NS}p":
+                continue
+            text = "".join(node.text or "" for node in element.iter(f"{WORD_NS}t"))
+            element.clear()
+            if text.strip():
+                paragraphs.append(text)
+            if len(paragraphs) >= paragraphs_per_page:
+                yield "\n\n".join(paragraphs)
+                paragraphs = []
+        if paragraphs:
+            yield "\n\n".join(paragraphs)
+
+# --- Worker process side ---
+def _init_worker(memory_limit_bytes: int) -> None:
+    if resource is not None and memory_limit_bytes > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+
+def _on_alarm(signum: int, frame: Any) -> None:
+    raise ParserTimeout()
+
+def _run_task(time_limit: float, fn: Callable[..., Any], *args: Any) -> Tuple[Any, float]:
+    # The alarm interrupts Python code; native code stuck on one page is handled by the parent.
+    timer = hasattr(signal, "setitimer")
+    if timer:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    started = time.perf_counter()
+    try:
+        return fn(*args), time.perf_counter() - started
+    finally:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _pdf_page_count(path: str) -> int:
+    import pymupdf
+    with pymupdf.open(path) as document:
+        return document.page_count
+
+def _pdf_page_texts(path: str, start: int, stop: int) -> List[str]:
+    import pymupdf
+    with pymupdf.open(path) as document:
+        return [document[number].get_text() for number in range(start, stop)]
+
+def _document_texts(path: str, mime_type: str) -> List[str]:
+    return list(iter_page_texts(path, mime_type))
+
+# --- Web worker side ---
+# Parses uploaded documents in a pool of worker processes, so text extraction uses
+# every core and never holds the event loop's GIL. PDFs are split into ranges of
+# `pages_per_task` pages that are parsed in parallel and put back in page order.
+# Each worker process runs under an address-space limit and is replaced after
+# `max_tasks_per_child` tasks; a task running past `task_timeout` seconds fails
+# with ParserTimeout, and one stuck in native code gets its pool killed and
+# recreated. Processes are started on first use.
+class DocumentParser:
+    def __init__(self, workers: int, pages_per_task: int, task_timeout: float,
+                 memory_limit_bytes: int, max_tasks_per_child: int):
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.task_timeout = task_timeout
+        self.memory_limit_bytes = memory_limit_bytes
+        self.max_tasks_per_child = max_tasks_per_child
+        self.documents = 0
+        self.pages = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def parse(self, path: str, mime_type: str,
+                    on_pages: Optional[Callable[[int], None]] = None) -> Tuple[List[str], Dict[str, Any]]:
+        # Returns the page texts and a throughput report; `on_pages(n)` is called as ranges finish.
+        started = time.perf_counter()
+        try:
+            if mime_type == MIME_PDF:
+                count = await self._submit(_pdf_page_count, path)
+                ranges = [(start, min(start + self.pages_per_task, count))
+                          for start in range(0, count, self.pages_per_task)]
+
+                async def parse_range(start: int, stop: int) -> List[str]:
+                    texts = await self._submit(_pdf_page_texts, path, start, stop)
+                    if on_pages is not None:
+                        on_pages(len(texts))
+                    return texts
+
+                parts = await asyncio.gather(*(parse_range(start, stop) for start, stop in ranges))
+                pages = [text for part in parts for text in part]
+                tasks = len(ranges)
+            else:
+                pages = await self._submit(_document_texts, path, mime_type)
+                if on_pages is not None:
+                    on_pages(len(pages))
+                tasks = 1
+        except Exception:
+            self.failed += 1
+            raise
+        seconds = time.perf_counter() - started
+        self.documents += 1
+        self.pages += len(pages)
+        return pages, {
+            "pages": len(pages),
+            "tasks": tasks,
+            "seconds": round(seconds, 3),
+            "pagesPerSecond": round(len(pages) / seconds, 1) if seconds > 0 else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "documents": self.documents,
+            "pages": self.pages,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "busySeconds": round(self.busy_seconds, 3),
+            # Pages parsed per second of worker time, i.e. per busy core.
+            "pagesPerCoreSecond": round(self.pages / self.busy_seconds, 1) if self.busy_seconds else None,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Recycling workers needs spawned (not forked) processes.
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_limit_bytes,),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        for attempt in range(2):
+            executor = self._pool()
+            future = asyncio.get_running_loop().run_in_executor(executor, _run_task, self.task_timeout, fn, *args)
+            try:
+                result, seconds = await asyncio.wait_for(future, self.task_timeout + KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._restart(executor)
+                raise ParserTimeout()
+            except ParserTimeout:
+                self.timeouts += 1
+                raise
+            except BrokenProcessPool:
+                # A worker died (memory limit, crash) or another task's timeout killed the pool.
+                restarted_elsewhere = executor is not self._executor
+                self._restart(executor)
+                if attempt == 0 and restarted_elsewhere:
+                    continue
+                raise
+            self.busy_seconds += seconds
+            return result
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        if executor is not self._executor:
+            return
+        self._executor = None
+        self.restarts += 1
+        # The executor can't cancel a running task; ending its processes is the only way out.
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+document_parser = DocumentParser(
+    workers=settings.parser_workers,
+    pages_per_task=settings.PARSER_PAGES_PER_TASK,
+    task_timeout=settings.PARSER_TASK_TIMEOUT_SECONDS,
+    memory_limit_bytes=settings.PARSER_WORKER_MEMORY_MB * 1024 * 1024,
+    max_tasks_per_child=settings.PARSER_MAX_TASKS_PER_CHILD,
+)
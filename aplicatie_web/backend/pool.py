@@ -0,0 +1,168 @@
+# Standard library imports
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, Optional, Set, Tuple
+
+# Local imports
+from config import settings
+
+__all__ = [
+    "ExercisePool",
+    "exercise_pool",
+]
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]
+
+# Rough size of the exercise prompt around the concept; the budget is charged
+# with estimates (about 4 characters per token), not with exact usage.
+PROMPT_OVERHEAD_TOKENS = 60
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 60
+
+# Ready exercise/hint pairs per known concept, handed out once each and refilled
+# in the background. Concepts asked for most recently are refilled first. The
+# refill worker keeps at most `concurrency` generations in flight and spends at
+# most `tokens_per_minute` estimated tokens; after a failed generation it backs
+# off before trying again.
+class ExercisePool:
+    def __init__(self, size: int, max_concepts: int, concurrency: int, tokens_per_minute: int):
+        self.size = size
+        self.max_concepts = max_concepts
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.generate: Optional[Callable[[str, asyncio.Event], Awaitable[Pair]]] = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+        self._pools: "OrderedDict[str, Deque[Pair]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._sent: Dict[str, asyncio.Event] = {}  # set once a refill has left the LLM queue
+        self._claimed: Set[str] = set()
+        self._tokens = float(tokens_per_minute)
+        self._tokens_at = time.monotonic()
+        self._failures = 0
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self, generate: Callable[[str, asyncio.Event], Awaitable[Pair]]) -> None:
+        self.generate = generate
+        if self.size > 0 and self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [*self._inflight.values(), *([self._worker] if self._worker else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+
+    def want(self, concepts: Iterable[str]) -> None:
+        if self.size <= 0:
+            return
+        for concept in concepts:
+            self._pools.setdefault(concept, deque())
+            self._pools.move_to_end(concept)
+        while len(self._pools) > self.max_concepts:
+            self._pools.popitem(last=False)
+        self._wakeup.set()
+
+    def take(self, concept: str) -> Optional[Pair]:
+        pool = self._pools.get(concept)
+        if not pool:
+            return None
+        self._wakeup.set()
+        return pool.popleft()
+
+    async def get(self, concept: str) -> Optional[Pair]:
+        # On an empty pool, a refill already sent upstream for the concept is handed
+        # to the caller instead of being stored, which beats starting a second call.
+        # One still queued at bulk priority is left alone: the caller makes its own
+        # call at its own priority rather than wait behind document extraction.
+        pair = self.take(concept)
+        if pair is None:
+            task = self._inflight.get(concept)
+            if task is not None and self._sent[concept].is_set() and concept not in self._claimed:
+                self._claimed.add(concept)
+                pair = await asyncio.shield(task)
+        if pair is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return pair
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "failed": self.failed,
+            "concepts": len(self._pools),
+            "ready": sum(len(pool) for pool in self._pools.values()),
+            "inflight": len(self._inflight),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while len(self._inflight) < self.concurrency:
+                wait = max(self._paused_until - time.monotonic(), self._budget_wait())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                concept = self._next_concept()
+                if concept is None:
+                    break
+                self._sent[concept] = asyncio.Event()
+                self._inflight[concept] = asyncio.create_task(self._fill(concept))
+
+    def _next_concept(self) -> Optional[str]:
+        for concept in reversed(self._pools):
+            if concept not in self._inflight and len(self._pools[concept]) < self.size:
+                return concept
+        return None
+
+    def _budget_wait(self) -> float:
+        now = time.monotonic()
+        rate = self.tokens_per_minute / 60
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + (now - self._tokens_at) * rate)
+        self._tokens_at = now
+        return 0.0 if self._tokens > 0 else -self._tokens / rate
+
+    async def _fill(self, concept: str) -> Optional[Pair]:
+        pair = None
+        try:
+            pair = await self.generate(concept, self._sent[concept])
+            self.generated += 1
+            self._failures = 0
+            self._tokens -= PROMPT_OVERHEAD_TOKENS + (len(concept) + len(pair[0]) + len(pair[1])) // 4
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            self._failures += 1
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (self._failures - 1))
+            self._paused_until = time.monotonic() + delay
+            logger.warning("Exercise pool refill for %r failed, pausing refills for %ds: %r", concept, delay, e)
+        finally:
+            del self._inflight[concept]
+            del self._sent[concept]
+            self._wakeup.set()
+        if concept in self._claimed:
+            self._claimed.discard(concept)
+        elif pair is not None and concept in self._pools:
+            self._pools[concept].append(pair)
+        return pair
+
+exercise_pool = ExercisePool(
+    size=settings.EXERCISE_POOL_SIZE,
+    max_concepts=settings.EXERCISE_POOL_MAX_CONCEPTS,
+    concurrency=settings.EXERCISE_POOL_CONCURRENCY,
+    tokens_per_minute=settings.exercise_pool_tokens_per_minute_per_worker,
+)
@@ -0,0 +1,266 @@
+# Standard library imports
+import asyncio
+import contextvars
+import hmac
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Third-party imports
+import orjson
+
+# Local imports
+from config import settings
+
+__all__ = [
+    "Profile",
+    "ProfileStore",
+    "Profiler",
+    "ProfilingMiddleware",
+    "authorized",
+    "profiler",
+    "span",
+]
+
+PROFILE_HEADER = b"x-profile"
+MAX_STACK_DEPTH = 64
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+_NO_SPAN = nullcontext()
+
+class Profile:
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.created_at = time.time()
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.tasks: Set[asyncio.Task] = set()
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0  # loop samples taken while this request was active
+        self.loop_busy_elsewhere = 0  # ...in which the loop was running another task
+
+    def add_current_task(self) -> None:
+        try:
+            self.tasks.add(asyncio.current_task())
+        except RuntimeError:  # a worker thread, no running loop
+            pass
+
+    def report(self, route: str, status: int, duration: float, interval: float) -> Dict[str, Any]:
+        totals: Dict[str, float] = {}
+        for name, _, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status,
+            "trigger": self.trigger,
+            "createdAt": self.created_at,
+            "durationMs": round(duration * 1000, 3),
+            "spanTotalsMs": {name: round(seconds * 1000, 3) for name, seconds in totals.items()},
+            "spans": [{"name": name, "startMs": round(start * 1000, 3), "durationMs": round(seconds * 1000, 3)}
+                      for name, start, seconds in self.spans],
+            "sampling": {
+                "intervalMs": interval * 1000,
+                "samples": self.samples,
+                "ownSamples": sum(self.stacks.values()),
+                "loopBusyElsewhere": self.loop_busy_elsewhere,
+            },
+            # Collapsed stacks ("outer;inner count"), the input format of flamegraph.pl and speedscope.
+            "stacks": self.stacks,
+        }
+
+class _Span:
+    __slots__ = ("profile", "name", "started")
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.profile.add_current_task()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        now = time.perf_counter()
+        self.profile.spans.append((self.name, self.started - self.profile.started, now - self.started))
+
+# `with span("db"):` times a phase of the request being profiled; when none is,
+# it costs a context variable lookup.
+def span(name: str):
+    profile = _current.get()
+    return _NO_SPAN if profile is None else _Span(profile, name)
+
+# Keeps the last `max_files` profiles as JSON files; the oldest are deleted first.
+class ProfileStore:
+    def __init__(self, root: str, max_files: int):
+        self.root = root
+        self.max_files = max_files
+
+    def save(self, report: Dict[str, Any]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        name = f"{int(report['createdAt'] * 1000):015d}-{report['id']}.json"
+        tmp_path = os.path.join(self.root, name + ".part")
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(report))
+        os.replace(tmp_path, os.path.join(self.root, name))
+        files = self._files()
+        for old in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.root, old))
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        summaries = []
+        for name in reversed(self._files()):
+            report = self._read(name)
+            if report is not None:
+                summaries.append({key: report[key] for key in
+                                  ("id", "method", "path", "route", "status", "trigger", "createdAt", "durationMs",
+                                   "spanTotalsMs")})
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        for name in self._files():
+            if name.endswith(f"-{profile_id}.json"):
+                return self._read(name)
+        return None
+
+    def _files(self) -> List[str]:
+        try:
+            return sorted(n for n in os.listdir(self.root) if n.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def _read(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.root, name), "rb") as f:
+                return orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return None
+
+# While at least one request is profiled, a thread samples the event loop
+# thread's stack every `interval` seconds with sys._current_frames(). A sample
+# is credited to the profile whose task the loop is running at that moment, so
+# each profile holds the CPU time of its own request rather than of whatever
+# else the worker was doing.
+class Profiler:
+    def __init__(self, store: ProfileStore, interval: float):
+        self.store = store
+        self.interval = interval
+        self._active: Set[Profile] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+
+    def start(self, profile: Profile) -> contextvars.Token:
+        profile.add_current_task()
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread_id = threading.get_ident()
+                self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                self._thread.start()
+        return _current.set(profile)
+
+    def stop(self, profile: Profile, token: contextvars.Token) -> None:
+        _current.reset(token)
+        with self._lock:
+            self._active.discard(profile)
+
+    def _sample(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            task = asyncio.current_task(self._loop)
+            owner = next((p for p in active if task in p.tasks), None) if task is not None else None
+            for profile in active:
+                profile.samples += 1
+                if task is not None and profile is not owner:
+                    profile.loop_busy_elsewhere += 1
+            if owner is not None and frame is not None:
+                stack = _collapse(frame)
+                owner.stacks[stack] = owner.stacks.get(stack, 0) + 1
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+# Pure ASGI middleware that profiles a request when it carries the admin token
+# in the X-Profile header, or at random for PROFILING_SAMPLE_RATE of requests.
+# Profiled responses get an X-Profile-Id header. With neither configured it
+# passes requests straight through.
+class ProfilingMiddleware:
+    def __init__(self, app, token: Optional[str] = None, sample_rate: float = 0.0):
+        self.app = app
+        self.token = token.encode("latin-1") if token else None
+        self.sample_rate = sample_rate
+        self.enabled = self.token is not None or sample_rate > 0
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = None
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER and hmac.compare_digest(value, self.token):
+                    trigger = "header"
+                    break
+        if trigger is None and self.sample_rate > 0 and random.random() < self.sample_rate:
+            trigger = "sample"
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], trigger)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-profile-id", profile.id.encode("latin-1"))]}
+            await send(message)
+
+        token = profiler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop(profile, token)
+            duration = time.perf_counter() - profile.started
+            route = getattr(scope.get("route"), "path", "unmatched")
+            report = profile.report(route, status, duration, profiler.interval)
+            await asyncio.to_thread(profiler.store.save, report)
+
+def authorized(token: Optional[str]) -> bool:
+    return settings.PROFILING_TOKEN is not None and token is not None and \
+        hmac.compare_digest(token.encode("utf-8"), settings.PROFILING_TOKEN.encode("utf-8"))
+
+profiler = Profiler(
+    ProfileStore(settings.profiling_dir, settings.PROFILING_MAX_FILES),
+    interval=settings.PROFILING_INTERVAL_MS / 1000,
+)
@@ -0,0 +1,228 @@
+# Standard library imports
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+# Local imports
+from metrics import LLM_CIRCUIT_STATE, LLM_HEDGES, LLM_RETRIES
+
+__all__ = [
+    "CircuitOpen",
+    "DeadlineExceeded",
+    "CircuitBreaker",
+    "LatencyTracker",
+    "UpstreamGuard",
+    "is_retryable",
+]
+
+T = TypeVar("T")
+
+# Less time than this left once a call leaves the queue: it isn't sent, as a timeout
+# that short would say nothing about the upstream.
+MIN_UPSTREAM_SECONDS = 1.0
+# The client's own timeout normally ends a slow request; this backstop only catches a hung one.
+REQUEST_GRACE_SECONDS = 1.0
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"OpenAI calls are suspended for {retry_after:.0f}s after repeated failures")
+        self.retry_after = retry_after
+
+class DeadlineExceeded(Exception):
+    pass
+
+def _openai() -> Any:
+    # The openai package is imported lazily by llm.get_client; until then no error can come from it.
+    return sys.modules.get("openai")
+
+def _is_status_error(e: BaseException) -> bool:
+    openai = _openai()
+    return openai is not None and isinstance(e, openai.APIStatusError)
+
+def is_retryable(e: BaseException) -> bool:
+    openai = _openai()
+    if openai is None:
+        return False
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and (e.status_code >= 500 or e.status_code in (408, 409))
+
+def _is_upstream_failure(e: BaseException) -> bool:
+    # A 429 means our own quota is spent, not that the upstream is unhealthy; our own
+    # deadlines and queue timeouts say nothing about it either.
+    openai = _openai()
+    return is_retryable(e) and not isinstance(e, openai.RateLimitError)
+
+def _retry_after(e: BaseException) -> float:
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0)) if response is not None else 0.0
+    except ValueError:
+        return 0.0
+
+# Closed: calls go through. After `failure_threshold` consecutive upstream
+# failures it opens and every call fails fast for `reset_seconds`; then it is
+# half-open and lets a single probe through, whose outcome closes or re-opens it.
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        LLM_CIRCUIT_STATE.set((), self.state)
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpen(remaining)
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpen(1.0)
+            self._probing = True
+
+    def abandon(self) -> None:
+        # The call was cancelled before the upstream answered; another call may probe.
+        self._probing = False
+
+    def record(self, error: Optional[BaseException]) -> None:
+        self._probing = False
+        if error is None or not _is_upstream_failure(error):
+            # The upstream answered (possibly with a client error): it is healthy.
+            if error is None or _is_status_error(error):
+                self.failures = 0
+                self._set_state(self.CLOSED)
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        LLM_CIRCUIT_STATE.set((), state)
+
+# Recent successful latencies per endpoint, for the hedging delay.
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, endpoint: str, seconds: float) -> None:
+        samples = self._samples.get(endpoint)
+        if samples is None:
+            samples = self._samples[endpoint] = deque(maxlen=self.size)
+        samples.append(seconds)
+
+    def percentile(self, endpoint: str, q: float, min_samples: int) -> Optional[float]:
+        samples = self._samples.get(endpoint)
+        if samples is None or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+# Wraps upstream attempts with an overall deadline, retries with exponential
+# backoff and full jitter for retryable errors (honouring Retry-After), and an
+# optional hedged second request once an attempt runs past the endpoint's p95.
+# An attempt may first wait in the local scheduler queue; the circuit breaker
+# only sees the HTTP request made afterwards through `request`, so calls that
+# expire while queued never open it.
+class UpstreamGuard:
+    def __init__(self, breaker: CircuitBreaker, max_retries: int, retry_base_seconds: float,
+                 retry_max_seconds: float, hedge: bool, hedge_min_samples: int):
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+
+    def retry_delay(self, e: BaseException, attempt: int, deadline_at: float) -> Optional[float]:
+        # Seconds to wait before retry number `attempt` (1-based), or None when giving up.
+        if attempt > self.max_retries or not is_retryable(e):
+            return None
+        backoff = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempt - 1)))
+        delay = max(backoff, _retry_after(e))
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        return delay
+
+    def begin(self, endpoint: str, deadline_at: float) -> float:
+        # Called right before an HTTP request: the seconds it may take. Raises
+        # DeadlineExceeded when too little is left to send it, CircuitOpen while the
+        # upstream is failing. Otherwise the breaker awaits `record` or `abandon`.
+        remaining = deadline_at - time.monotonic()
+        if remaining < MIN_UPSTREAM_SECONDS:
+            raise DeadlineExceeded(f"{endpoint} deadline passed before the request was sent")
+        self.breaker.before_call()
+        return remaining
+
+    async def request(self, endpoint: str, deadline_at: float, send: Callable[[float], Awaitable[T]]) -> T:
+        # `send(timeout)` makes one HTTP request; its outcome is what the breaker records.
+        remaining = self.begin(endpoint, deadline_at)
+        try:
+            result = await asyncio.wait_for(send(remaining), remaining + REQUEST_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            self.breaker.abandon()
+            raise DeadlineExceeded(f"{endpoint} took longer than {remaining:.1f}s")
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception as e:
+            self.breaker.record(e)
+            raise
+        self.breaker.record(None)
+        return result
+
+    async def run(self, endpoint: str, deadline_at: float, attempt: Callable[[float], Awaitable[T]]) -> T:
+        # `attempt(remaining)` queues for a slot (QueueTimeout when it can't get one in
+        # `remaining` seconds) and then makes one upstream request through `request`.
+        for number in range(1, self.max_retries + 2):
+            try:
+                if deadline_at - time.monotonic() <= 0:
+                    raise DeadlineExceeded(f"{endpoint} deadline passed")
+                return await self._attempt(endpoint, attempt, deadline_at)
+            except Exception as e:
+                delay = self.retry_delay(e, number, deadline_at)
+                if delay is None:
+                    raise
+                LLM_RETRIES.inc((endpoint, type(e).__name__))
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def _attempt(self, endpoint: str, attempt: Callable[[float], Awaitable[T]], deadline_at: float) -> T:
+        # Attempts bound themselves: the queue wait by QueueTimeout, the request by `request`.
+        remaining = deadline_at - time.monotonic()
+        delay = self.latency.percentile(endpoint, 95, self.hedge_min_samples) if self.hedge else None
+        if delay is None or delay >= remaining:
+            return await attempt(remaining)
+
+        primary = asyncio.ensure_future(attempt(remaining))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                LLM_HEDGES.inc((endpoint, "sent"))
+                tasks.add(asyncio.ensure_future(attempt(deadline_at - time.monotonic())))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            LLM_HEDGES.inc((endpoint, "won"))
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
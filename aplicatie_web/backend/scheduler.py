@@ -0,0 +1,151 @@
+# Standard library imports
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+# Local imports
+from metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_DROPPED, LLM_QUEUE_WAIT_SECONDS
+
+__all__ = [
+    "Priority",
+    "QueueTimeout",
+    "Ticket",
+    "LLMScheduler",
+]
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # a student is waiting on feedback
+    GENERATION = 1  # exercise generation on request
+    BULK = 2  # document extraction and background refills
+
+class QueueTimeout(Exception):
+    pass
+
+class Ticket:
+    __slots__ = ("priority", "session_id", "tokens", "deadline", "enqueued_at", "future", "used_tokens")
+
+    def __init__(self, priority: Priority, session_id: str, tokens: int, deadline: Optional[float]):
+        self.priority = priority
+        self.session_id = session_id
+        self.tokens = tokens
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Set by the caller from response.usage; the rate budget is corrected with it on release.
+        self.used_tokens: Optional[int] = None
+
+# Admission control for upstream LLM calls. A call waits in the queue of its
+# priority class until a concurrency slot is free and the request and token
+# buckets (refilled continuously at the per-minute rates of our OpenAI tier)
+# cover it. Classes are served strictly by priority; within a class, sessions
+# take turns (round robin), so one session queueing many calls can't starve the
+# others. Token costs are estimated up front and corrected once the real usage
+# is known. A call still queued when its deadline passes fails with QueueTimeout.
+class LLMScheduler:
+    def __init__(self, max_concurrent: int, requests_per_minute: int, tokens_per_minute: int):
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.running = 0
+        self._queues: List["OrderedDict[str, Deque[Ticket]]"] = [OrderedDict() for _ in Priority]
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, session_id: str, tokens: int,
+                   timeout: Optional[float] = None) -> AsyncIterator[Ticket]:
+        ticket = Ticket(priority, session_id, tokens, None if timeout is None else time.monotonic() + timeout)
+        self._queues[priority].setdefault(session_id, deque()).append(ticket)
+        LLM_QUEUE_DEPTH.inc((priority.name.lower(),))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout)
+        except BaseException as e:
+            if not ticket.future.done():
+                # Still queued: leave it for _dispatch to skip, and report why it left.
+                ticket.future.cancel()
+                LLM_QUEUE_DEPTH.dec((priority.name.lower(),))
+                reason = "deadline" if isinstance(e, asyncio.TimeoutError) else "cancelled"
+                LLM_QUEUE_DROPPED.inc((priority.name.lower(), reason))
+                if reason == "deadline":
+                    raise QueueTimeout(f"LLM call waited more than {timeout:g}s in the {priority.name.lower()} queue")
+                raise
+            # The slot was granted right as the wait ended: use it on a timeout, give it back otherwise.
+            if not isinstance(e, asyncio.TimeoutError):
+                self._release(ticket)
+                raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": self.running,
+            **{f"queued_{priority.name.lower()}": self._depth(priority) for priority in Priority},
+        }
+
+    def _depth(self, priority: Priority) -> int:
+        return sum(1 for queue in self._queues[priority].values() for t in queue if not t.future.done())
+
+    def _release(self, ticket: Ticket) -> None:
+        self.running -= 1
+        if ticket.used_tokens is not None:
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + ticket.tokens - ticket.used_tokens)
+        self._dispatch()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._requests = min(float(self.requests_per_minute), self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _next(self) -> Optional[Ticket]:
+        for queues in self._queues:
+            while queues:
+                session_id, queue = next(iter(queues.items()))
+                while queue and queue[0].future.done():
+                    queue.popleft()  # timed out or cancelled while queued
+                if not queue:
+                    del queues[session_id]
+                    continue
+                return queue[0]
+        return None
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        while self.running < self.max_concurrent:
+            ticket = self._next()
+            if ticket is None:
+                return
+            # A call larger than the whole bucket only waits for a full bucket.
+            tokens = min(ticket.tokens, self.tokens_per_minute)
+            if self._requests < 1 or self._tokens < tokens:
+                wait = max((1 - self._requests) * 60 / self.requests_per_minute,
+                           (tokens - self._tokens) * 60 / self.tokens_per_minute)
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            self._requests -= 1
+            self._tokens -= ticket.tokens
+            self.running += 1
+            queues = self._queues[ticket.priority]
+            queue = queues[ticket.session_id]
+            queue.popleft()
+            # Round robin: this session goes to the back of its class.
+            if queue:
+                queues.move_to_end(ticket.session_id)
+            else:
+                del queues[ticket.session_id]
+            priority = ticket.priority.name.lower()
+            LLM_QUEUE_DEPTH.dec((priority,))
+            LLM_QUEUE_WAIT_SECONDS.observe((priority,), time.monotonic() - ticket.enqueued_at)
+            ticket.future.set_result(None)
@@ -7,10 +7,18 @@ class AuthCredentials(BaseModel):
 class MasterConcept(BaseModel):
     concept: str
 
+class MasterConceptBatch(BaseModel):
+    concepts: list[MasterConcept]
+
 class ExerciseRequest(BaseModel):
     concept: str
+    stream: bool = False
+
+class ExerciseBatchRequest(BaseModel):
+    concepts: list[str]
 
 class SolutionSubmission(BaseModel):
     concept: str
     exercise: str
-    solution: str
\ No newline at end of file
+    solution: str
+    stream: bool = False
\ No newline at end of file
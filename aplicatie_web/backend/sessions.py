@@ -0,0 +1,303 @@
+# Standard library imports
+import asyncio
+import logging
+import re
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Third-party imports
+import orjson
+from sqlalchemy import delete, func, select
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm.attributes import flag_modified
+
+# Local imports
+from config import settings
+from database import SessionLocal
+from models_orm import SessionState
+from profiling import span
+
+__all__ = [
+    "SessionStore",
+    "MemorySessionStore",
+    "DatabaseSessionStore",
+    "SessionMiddleware",
+    "session_store",
+]
+
+SESSION_COOKIE = "session_id"
+# Ids are issued by secrets.token_urlsafe(32); anything else is replaced with a new one.
+SESSION_ID_RE = re.compile(r"[A-Za-z0-9_-]{16,64}")
+
+logger = logging.getLogger(__name__)
+
+# Per-session key/value state ("user", "concepts", "links", ...). Values must be
+# JSON-serialisable. `update` is the read-modify-write primitive: it applies `fn`
+# to the current value atomically with respect to other writers of the same key.
+class SessionStore:
+    def __init__(self):
+        self._evict_callbacks: List[Callable[[str], None]] = []
+        self._evict_tasks: Set[asyncio.Task] = set()
+
+    def on_evict(self, callback: Callable[[str], None]) -> None:
+        # Callbacks may block (the content store writes SQLite), so they run in a worker thread.
+        self._evict_callbacks.append(callback)
+
+    async def get(self, session_id: str, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    async def set(self, session_id: str, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    async def update(self, session_id: str, key: str, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        raise NotImplementedError
+
+    async def discard(self, session_id: str, key: str) -> None:
+        raise NotImplementedError
+
+    async def count(self) -> int:
+        raise NotImplementedError
+
+    async def session_ids(self) -> Set[str]:
+        raise NotImplementedError
+
+    def _evicted(self, session_id: str) -> None:
+        for callback in self._evict_callbacks:
+            task = asyncio.get_running_loop().create_task(self._run_evict_callback(callback, session_id))
+            self._evict_tasks.add(task)
+            task.add_done_callback(self._evict_tasks.discard)
+
+    @staticmethod
+    async def _run_evict_callback(callback: Callable[[str], None], session_id: str) -> None:
+        try:
+            await asyncio.to_thread(callback, session_id)
+        except Exception as e:
+            logger.error("Session eviction callback failed for %s: %r", session_id, e)
+
+# Process-local store with LRU order, idle expiry and a memory cap measured as the
+# JSON size of the stored values.
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_sessions: int, idle_ttl_seconds: int, max_bytes: int):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def get(self, session_id: str, key: str, default: Any = None) -> Any:
+        entry = self._touch(session_id)
+        if entry is None:
+            return default
+        return entry["data"].get(key, default)
+
+    async def set(self, session_id: str, key: str, value: Any) -> None:
+        entry = self._touch(session_id, create=True)
+        entry["data"][key] = value
+        self._resize(entry)
+        self._enforce_limits()
+
+    async def update(self, session_id: str, key: str, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        entry = self._touch(session_id)
+        value = fn(default if entry is None else entry["data"].get(key, default))
+        # Created only once `fn` has succeeded, so a failed update leaves no empty session behind.
+        entry = entry or self._touch(session_id, create=True)
+        entry["data"][key] = value
+        self._resize(entry)
+        self._enforce_limits()
+        return value
+
+    async def discard(self, session_id: str, key: str) -> None:
+        entry = self._touch(session_id)
+        if entry is not None and entry["data"].pop(key, None) is not None:
+            self._resize(entry)
+
+    async def count(self) -> int:
+        return len(self._sessions)
+
+    async def session_ids(self) -> Set[str]:
+        return set(self._sessions)
+
+    def _touch(self, session_id: str, create: bool = False) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        entry = self._sessions.get(session_id)
+        if entry is not None and now - entry["touched"] > self.idle_ttl_seconds:
+            self._drop(session_id)
+            entry = None
+        if entry is None:
+            if not create:
+                return None
+            entry = self._sessions[session_id] = {"data": {}, "bytes": 0, "touched": now}
+        entry["touched"] = now
+        self._sessions.move_to_end(session_id)
+        return entry
+
+    def _resize(self, entry: Dict[str, Any]) -> None:
+        size = len(orjson.dumps(entry["data"]))
+        self.total_bytes += size - entry["bytes"]
+        entry["bytes"] = size
+
+    def _enforce_limits(self) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            expired = now - entry["touched"] > self.idle_ttl_seconds
+            over = len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+            # Keep the most recent session even if it alone exceeds the memory cap.
+            if not (expired or over) or len(self._sessions) == 1:
+                break
+            self._drop(session_id)
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id)
+        self.total_bytes -= entry["bytes"]
+        self._evicted(session_id)
+
+# Store shared by every worker, backed by the `session_state` table through the
+# existing SQLAlchemy engine. Sessions idle for longer than the TTL are purged
+# periodically. Queries run in a worker thread to keep the event loop free.
+class DatabaseSessionStore(SessionStore):
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self, session_factory, idle_ttl_seconds: int):
+        super().__init__()
+        self.session_factory = session_factory
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._last_purge = time.monotonic()
+
+    async def get(self, session_id: str, key: str, default: Any = None) -> Any:
+        def run() -> Any:
+            with self.session_factory() as db:
+                value = db.execute(
+                    select(SessionState.value).where(SessionState.session_id == session_id, SessionState.key == key)
+                ).scalar_one_or_none()
+            return default if value is None else value
+
+        with span("db"):
+            return await asyncio.to_thread(run)
+
+    async def set(self, session_id: str, key: str, value: Any) -> None:
+        await self.update(session_id, key, lambda _: value)
+
+    async def update(self, session_id: str, key: str, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        def run() -> Any:
+            with self.session_factory.begin() as db:
+                db.execute(
+                    insert(SessionState)
+                    .values(session_id=session_id, key=key, value=None)
+                    .on_conflict_do_nothing(index_elements=[SessionState.session_id, SessionState.key])
+                )
+                row = db.execute(
+                    select(SessionState)
+                    .where(SessionState.session_id == session_id, SessionState.key == key)
+                    .with_for_update()
+                ).scalar_one()
+                # Raising here rolls back the transaction, placeholder row included.
+                value = fn(default if row.value is None else row.value)
+                row.value = value
+                flag_modified(row, "value")  # `fn` may have mutated the loaded value in place
+                row.updated_at = datetime.now(timezone.utc)
+            return value
+
+        with span("db"):
+            value = await asyncio.to_thread(run)
+        await self._maybe_purge()
+        return value
+
+    async def discard(self, session_id: str, key: str) -> None:
+        def run() -> None:
+            with self.session_factory.begin() as db:
+                db.execute(delete(SessionState).where(SessionState.session_id == session_id, SessionState.key == key))
+
+        with span("db"):
+            await asyncio.to_thread(run)
+
+    async def count(self) -> int:
+        def run() -> int:
+            with self.session_factory() as db:
+                return db.execute(select(func.count(func.distinct(SessionState.session_id)))).scalar_one()
+
+        with span("db"):
+            return await asyncio.to_thread(run)
+
+    async def session_ids(self) -> Set[str]:
+        def run() -> Set[str]:
+            with self.session_factory() as db:
+                return set(db.execute(select(SessionState.session_id).distinct()).scalars())
+
+        with span("db"):
+            return await asyncio.to_thread(run)
+
+    async def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge < self.PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.idle_ttl_seconds)
+
+        def run() -> List[str]:
+            idle = (
+                select(SessionState.session_id)
+                .group_by(SessionState.session_id)
+                .having(func.max(SessionState.updated_at) < cutoff)
+            )
+            with self.session_factory.begin() as db:
+                return list(db.execute(
+                    delete(SessionState).where(SessionState.session_id.in_(idle)).returning(SessionState.session_id)
+                ).scalars().unique())
+
+        for session_id in await asyncio.to_thread(run):
+            self._evicted(session_id)
+
+def create_session_store() -> SessionStore:
+    if settings.SESSION_BACKEND == "database":
+        return DatabaseSessionStore(SessionLocal, settings.SESSION_IDLE_TTL_SECONDS)
+    return MemorySessionStore(
+        max_sessions=settings.SESSION_MAX_SESSIONS,
+        idle_ttl_seconds=settings.SESSION_IDLE_TTL_SECONDS,
+        max_bytes=settings.session_max_bytes,
+    )
+
+session_store = create_session_store()
+
+# Pure ASGI middleware that puts the session id in `request.state.session_id`.
+# A new id is allocated, and the cookie sent, only when the request has none or
+# its id is malformed.
+class SessionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        session_id = None
+        secure = False
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                session_id = cookie_parser(value.decode("latin-1")).get(SESSION_COOKIE) or session_id
+            elif name == b"x-forwarded-proto":
+                secure = value.decode("latin-1").strip().lower() == "https"
+        secure = secure or scope.get("scheme") == "https"
+        if session_id and not SESSION_ID_RE.fullmatch(session_id):
+            session_id = None
+        scope.setdefault("state", {})["session_id"] = session_id or secrets.token_urlsafe(32)
+        if session_id:
+            await self.app(scope, receive, send)
+            return
+
+        cookie = f"{SESSION_COOKIE}={scope['state']['session_id']}; HttpOnly; Path=/; SameSite=Lax"
+        if secure:
+            cookie += "; Secure"
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("set-cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
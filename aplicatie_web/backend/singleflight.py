@@ -0,0 +1,42 @@
+# Standard library imports
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+__all__ = [
+    "SingleFlight",
+]
+
+T = TypeVar("T")
+
+# Coalesces concurrent calls that share a key: the first caller starts the work,
+# later callers wait on the same task and receive its result (or its exception).
+# The shared task is shielded, so one caller disconnecting doesn't cancel it for the rest.
+class SingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.deduplicated = 0
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.deduplicated += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "inflight": len(self._inflight),
+        }
+
+    def _forget(self, key: str, task: "asyncio.Future") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every waiter has gone away
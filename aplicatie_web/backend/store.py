@@ -0,0 +1,188 @@
+# Standard library imports
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+# Local imports
+from config import settings
+
+__all__ = [
+    "ContentStore",
+    "content_store",
+]
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed store for uploads. Files live under `root/<aa>/<sha256><ext>`,
+# so identical uploads share one copy no matter what they were called. A SQLite
+# index tracks, per hash, the sessions referencing it and the cached extraction
+# result (concept list and links; the extracted text is kept next to the file as
+# `<sha256>.text`) with the key of the settings that produced it, which lets a
+# re-upload of a known document skip the LLM while those settings hold. Once
+# the store grows past `max_bytes`, unreferenced documents are evicted LRU first.
+# Refs outlive the process while memory sessions don't, so `retain_sessions`
+# drops those of sessions that no longer exist at startup.
+class ContentStore:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def blob_path(self, sha256: str, ext: str = "") -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}{ext}")
+
+    def text_path(self, sha256: str) -> str:
+        return self.blob_path(sha256, ".text")
+
+    def adopt(self, tmp_path: str, sha256: str, ext: str, size: int, session_id: str, filename: str) -> str:
+        path = self.blob_path(sha256, ext)
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT ext FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                db.execute(
+                    "INSERT INTO blobs (sha256, ext, size, refcount, last_used) VALUES (?, ?, ?, 0, ?)",
+                    (sha256, ext, size, time.time()),
+                )
+            else:
+                os.remove(tmp_path)
+                path = self.blob_path(sha256, row[0])
+            added = db.execute(
+                "INSERT OR IGNORE INTO refs (sha256, session_id, filename) VALUES (?, ?, ?)",
+                (sha256, session_id, filename),
+            ).rowcount
+            db.execute(
+                "UPDATE blobs SET refcount = refcount + ?, last_used = ? WHERE sha256 = ?",
+                (added, time.time(), sha256),
+            )
+            db.commit()
+        self.evict()
+        return path
+
+    def release_session(self, session_id: str) -> None:
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "UPDATE blobs SET refcount = refcount - 1 "
+                "WHERE sha256 IN (SELECT sha256 FROM refs WHERE session_id = ?)",
+                (session_id,),
+            )
+            db.execute("DELETE FROM refs WHERE session_id = ?", (session_id,))
+            db.commit()
+
+    def retain_sessions(self, live: Set[str]) -> int:
+        # Releases the documents of every session not in `live`; returns how many sessions that was.
+        with self._lock:
+            db = self._connect()
+            gone = [(session_id,) for (session_id,) in db.execute("SELECT DISTINCT session_id FROM refs")
+                    if session_id not in live]
+            db.executemany("DELETE FROM refs WHERE session_id = ?", gone)
+            db.execute("UPDATE blobs SET refcount = (SELECT COUNT(*) FROM refs WHERE refs.sha256 = blobs.sha256)")
+            db.commit()
+        self.evict()
+        return len(gone)
+
+    def get_extraction(self, sha256: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT concepts, links FROM blobs WHERE sha256 = ? AND concepts IS NOT NULL AND extraction_key = ?",
+                (sha256, key),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {"concepts": json.loads(row[0]), "links": json.loads(row[1])}
+
+    def put_extraction(self, sha256: str, key: str, text: str, concepts: List[str],
+                       links: Dict[str, Dict[str, int]]) -> None:
+        text_path = self.text_path(sha256)
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        with self._lock:
+            db = self._connect()
+            # The text of the same file is the same under any key, so its size is only added once.
+            db.execute(
+                "UPDATE blobs SET size = size + CASE WHEN concepts IS NULL THEN ? ELSE 0 END,"
+                " concepts = ?, links = ?, extraction_key = ? WHERE sha256 = ?",
+                (os.path.getsize(text_path), json.dumps(concepts), json.dumps(links), key, sha256),
+            )
+            db.commit()
+        self.evict()
+
+    def read_text(self, sha256: str) -> Optional[str]:
+        try:
+            with open(self.text_path(sha256), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def evict(self) -> None:
+        with self._lock:
+            db = self._connect()
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            candidates = db.execute(
+                "SELECT sha256, ext, size FROM blobs WHERE refcount <= 0 ORDER BY last_used"
+            ).fetchall()
+            for sha256, ext, size in candidates:
+                if total <= self.max_bytes:
+                    break
+                for path in (self.blob_path(sha256, ext), self.text_path(sha256)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                db.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                total -= size
+                self.evictions += 1
+            db.commit()
+        if total > self.max_bytes:
+            logger.warning("Upload store holds %d bytes of referenced documents, above its %d byte limit",
+                           total, self.max_bytes)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            documents, total = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+        return {
+            "documents": documents,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), check_same_thread=False)
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " sha256 TEXT PRIMARY KEY, ext TEXT NOT NULL, size INTEGER NOT NULL,"
+                " refcount INTEGER NOT NULL, last_used REAL NOT NULL, concepts TEXT, links TEXT,"
+                " extraction_key TEXT);"
+                "CREATE TABLE IF NOT EXISTS refs ("
+                " sha256 TEXT NOT NULL, session_id TEXT NOT NULL, filename TEXT NOT NULL,"
+                " PRIMARY KEY (sha256, session_id));"
+                "CREATE INDEX IF NOT EXISTS ix_refs_session ON refs (session_id);"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(blobs)")}
+            if "extraction_key" not in columns:  # indexes from before extractions were keyed: all get redone
+                self._db.execute("ALTER TABLE blobs ADD COLUMN extraction_key TEXT")
+                self._db.commit()
+        return self._db
+
+content_store = ContentStore(settings.UPLOAD_DIR, settings.upload_store_max_bytes)
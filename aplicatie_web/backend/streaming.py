@@ -0,0 +1,90 @@
+# Standard library imports
+from typing import Any, List, Tuple
+
+# Third-party imports
+import orjson
+
+__all__ = [
+    "SSE_HEADERS",
+    "sse_event",
+    "ExerciseStreamParser",
+]
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # stop reverse proxies from buffering the stream
+}
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+# Splits an "Exercise:\n...\n\nHint:\n..." completion into its two sections while
+# it is still streaming. `feed` returns the (section, text) pieces that are safe to
+# forward: the label is dropped, surrounding whitespace is trimmed, and a few trailing
+# characters are held back in case they are the start of the "Hint:" marker.
+class ExerciseStreamParser:
+    EXERCISE_LABEL = "Exercise:"
+    HINT_LABEL = "Hint:"
+
+    def __init__(self):
+        self.section = "exercise"
+        self.parts = {"exercise": [], "hint": []}
+        self._buffer = ""
+        self._label_checked = False
+
+    @property
+    def exercise(self) -> str:
+        return "".join(self.parts["exercise"])
+
+    @property
+    def hint(self) -> str:
+        return "".join(self.parts["hint"])
+
+    def feed(self, delta: str) -> List[Tuple[str, str]]:
+        self._buffer += delta
+        events: List[Tuple[str, str]] = []
+
+        if not self._label_checked:
+            head = self._buffer.lstrip()
+            if len(head) < len(self.EXERCISE_LABEL) and self.EXERCISE_LABEL.startswith(head):
+                return events
+            if head.startswith(self.EXERCISE_LABEL):
+                self._buffer = head[len(self.EXERCISE_LABEL):]
+            self._label_checked = True
+
+        if self.section == "exercise":
+            marker = self._buffer.find(self.HINT_LABEL)
+            if marker >= 0:
+                self._emit(events, self._buffer[:marker].rstrip())
+                self.section = "hint"
+                self._buffer = self._buffer[marker + len(self.HINT_LABEL):]
+            else:
+                safe = max(0, len(self._buffer) - (len(self.HINT_LABEL) - 1))
+                self._emit_safe(events, safe)
+                return events
+
+        self._emit_safe(events, len(self._buffer))
+        return events
+
+    def close(self) -> List[Tuple[str, str]]:
+        events: List[Tuple[str, str]] = []
+        if not self._label_checked:
+            self._label_checked = True
+            self._buffer = self._buffer.lstrip().removeprefix(self.EXERCISE_LABEL)
+        self._emit(events, self._buffer.rstrip())
+        self._buffer = ""
+        return events
+
+    def _emit_safe(self, events: List[Tuple[str, str]], end: int) -> None:
+        # Trailing whitespace stays buffered so the section can be trimmed at its end.
+        text = self._buffer[:end]
+        keep = len(text) - len(text.rstrip())
+        self._emit(events, text[:len(text) - keep])
+        self._buffer = self._buffer[len(text) - keep:]
+
+    def _emit(self, events: List[Tuple[str, str]], text: str) -> None:
+        if not self.parts[self.section]:
+            text = text.lstrip()
+        if text:
+            self.parts[self.section].append(text)
+            events.append((self.section, text))
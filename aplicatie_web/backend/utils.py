@@ -1,19 +1,30 @@
 # Standard library imports
-from typing import Dict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
 
 # Third-party imports
 from argon2 import PasswordHasher
 from argon2.exceptions import VerificationError
 
-session_users: Dict[str, str] = {}
+# Local imports
+from config import settings
 
 __all__ = [
     "hash_password",
     "verify_password",
-    "generate_avatar"
+    "verify_and_rehash",
+    "generate_avatar",
+    "HashingPool",
+    "HasherBusy",
+    "hashing_pool",
 ]
 
-password_hasher = PasswordHasher(time_cost=2, memory_cost=49152, parallelism=1)
+password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+)
 
 def hash_password(password: str) -> str:
     return password_hasher.hash(password)
@@ -24,6 +35,43 @@ def verify_password(password: str, hashed: str) -> bool:
     except VerificationError:
         return False
 
+def verify_and_rehash(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    # Returns a fresh hash when the stored one was made with different hasher parameters.
+    if not verify_password(password, hashed):
+        return False, None
+    if password_hasher.check_needs_rehash(hashed):
+        return True, password_hasher.hash(password)
+    return True, None
+
+class HasherBusy(Exception):
+    pass
+
+# Runs Argon2 off the event loop. argon2-cffi releases the GIL while hashing, so a
+# thread pool uses every worker thread's core; the pool size also bounds how many
+# memory_cost-sized buffers are live at once. Calls beyond workers + queue_depth
+# fail fast with HasherBusy instead of queueing without limit.
+class HashingPool:
+    def __init__(self, workers: int, queue_depth: int):
+        self.capacity = workers + queue_depth
+        self.pending = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HasherBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+hashing_pool = HashingPool(settings.password_hash_workers, settings.PASSWORD_HASH_QUEUE_DEPTH)
+
 def generate_avatar(username: str) -> Dict[str, str]:
     initial = username[0].upper()
     colors = ["#DC2626", "#EA580C", "#D97706", "#CA8A04",
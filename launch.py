@@ -1,9 +1,13 @@
 import os
+import ssl
 import sys
 import time
 import pathlib
+import argparse
+import threading
 import subprocess
 import signal
+import urllib.request
 
 ROOT = pathlib.Path(__file__).parent.resolve()
 APP_ROOT = ROOT / "aplicatie_web"
@@ -19,6 +23,9 @@ FRONTEND_PORT = os.getenv("FRONTEND_PORT", "5173")
 
 CREATE_NEW_PROCESS_GROUP = 0x00000200
 
+DEV_STOP_TIMEOUT = 5.0
+READY_TIMEOUT = 60.0
+
 env = os.environ.copy()
 env.setdefault("VITE_API_BASE_URL", f"https://localhost:{BACKEND_PORT}")
 
@@ -72,53 +79,139 @@ def force_stop(p: subprocess.Popen) -> None:
         print(f"[warn] OS error hard-killing PID {p.pid}: {e}")
 
 
-def main() -> int:
-    if not (CERT.exists() and KEY.exists()):
-        print(f"[start] Missing TLS certs:\n  {CERT}\n  {KEY}\nCreate them and retry.")
-        return 1
-
-    backend_cmd = [
-        sys.executable, "-m", "uvicorn", "main:app", "--reload",
+def backend_cmd(production: bool, workers: int, drain_seconds: float) -> list[str]:
+    cmd = [
+        sys.executable, "-m", "uvicorn", "main:app",
         "--port", BACKEND_PORT,
         "--ssl-certfile", str(CERT),
         "--ssl-keyfile",  str(KEY),
     ]
+    if not production:
+        return cmd + ["--reload"]
+    return cmd + [
+        "--workers", str(workers),
+        "--loop", "asyncio" if os.name == "nt" else "uvloop",  # uvloop has no Windows build
+        "--http", "httptools",
+        "--no-access-log",
+        # Uvicorn stops accepting on SIGTERM and gives open requests this long to finish.
+        "--timeout-graceful-shutdown", str(int(drain_seconds)),
+    ]
 
-    frontend_cmd = pnpm_cmd() + ["run", "dev"]
+def frontend_cmd(production: bool) -> list[str]:
+    return pnpm_cmd() + (["run", "preview", "--port", FRONTEND_PORT] if production else ["run", "dev"])
+
+def wait_ready(url: str, p: subprocess.Popen, timeout: float) -> bool:
+    # The dev certificate is self-signed, so the probe doesn't verify it.
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2.0, context=context) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        try:
+            p.wait(timeout=0.5)
+            return False  # exited during startup
+        except subprocess.TimeoutExpired:
+            pass
+    return False
+
+def watch(procs: list[subprocess.Popen]) -> threading.Event:
+    # Set as soon as any child exits; one waiting thread per child, no polling.
+    exited = threading.Event()
+
+    def wait_for(p: subprocess.Popen) -> None:
+        p.wait()
+        exited.set()
+
+    for p in procs:
+        threading.Thread(target=wait_for, args=(p,), daemon=True).start()
+    return exited
+
+def stop_all(procs: list[subprocess.Popen], timeout: float) -> None:
+    for p in procs:
+        graceful_stop(p)
+
+    deadline = time.monotonic() + timeout
+    for p in procs:
+        try:
+            p.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            pass
+
+    for p in procs:
+        force_stop(p)
+
+    for p in procs:
+        try:
+            p.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            pass
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Start the backend and the frontend.")
+    parser.add_argument("--production", action="store_true",
+                        help="multi-worker backend without reload, built frontend served by 'vite preview'")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="backend worker processes in production mode (default: CPU cores)")
+    parser.add_argument("--drain-seconds", type=float, default=30.0,
+                        help="time given to in-flight requests on shutdown in production mode")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_args()
+    if not (CERT.exists() and KEY.exists()):
+        print(f"[start] Missing TLS certs:\n  {CERT}\n  {KEY}\nCreate them and retry.")
+        return 1
+
+    # Workers split the OpenAI rate limits between them and must share sessions and upload jobs.
+    workers = args.workers if args.production else 1
+    env["WEB_CONCURRENCY"] = str(workers)
+    if workers > 1:
+        if env.get("SESSION_BACKEND", "database") != "database":
+            print(f"[start] SESSION_BACKEND={env['SESSION_BACKEND']} isn't shared between workers, "
+                  "using SESSION_BACKEND=database.")
+        env["SESSION_BACKEND"] = "database"
+
+    if args.production:
+        print("[start] Building frontend...")
+        if subprocess.run(pnpm_cmd() + ["run", "build"], cwd=str(FRONTEND), env=env).returncode != 0:
+            print("[start] Frontend build failed.")
+            return 1
 
     procs = [
-        spawn(backend_cmd, str(BACKEND)),
-        spawn(frontend_cmd, str(FRONTEND)),
+        spawn(backend_cmd(args.production, args.workers, args.drain_seconds), str(BACKEND)),
+        spawn(frontend_cmd(args.production), str(FRONTEND)),
     ]
-
-    print(f"[start] Backend : https://localhost:{BACKEND_PORT}")
-    print(f"[start] Frontend: https://localhost:{FRONTEND_PORT}  (set in vite.config.ts)")
+    # Backend drain time plus a little for the lifespan shutdown, before anything is killed.
+    stop_timeout = args.drain_seconds + 5.0 if args.production else DEV_STOP_TIMEOUT
 
     try:
-        while True:
-            if any(p.poll() is not None for p in procs):
-                break
-            time.sleep(0.2)
+        started = time.monotonic()
+        if not wait_ready(f"https://localhost:{BACKEND_PORT}/", procs[0], READY_TIMEOUT):
+            print(f"[start] Backend did not become ready within {READY_TIMEOUT:.0f}s.")
+            return 1
+        mode = f"production, {args.workers} workers" if args.production else "development, reload"
+        print(f"[start] Backend : https://localhost:{BACKEND_PORT}  ({mode}, ready in {time.monotonic() - started:.1f}s)")
+        print(f"[start] Frontend: https://localhost:{FRONTEND_PORT}  (set in vite.config.ts)")
+
+        exited = watch(procs)
+        if os.name == "nt":
+            # An untimed wait can't be interrupted by Ctrl+C on Windows.
+            while not exited.wait(1.0):
+                pass
+        else:
+            exited.wait()
     except KeyboardInterrupt:
         print("\n[stop] Caught Ctrl+C, shutting down...")
     finally:
-        for p in procs:
-            graceful_stop(p)
-
-        deadline = time.time() + 5.0
-        while time.time() < deadline and any(p.poll() is None for p in procs):
-            time.sleep(0.1)
-
-        for p in procs:
-            force_stop(p)
-
-        for p in procs:
-            try:
-                p.wait(timeout=1.0)
-            except subprocess.TimeoutExpired:
-                pass
+        stop_all(procs, stop_timeout)
 
     return 0
 
 if __name__ == "__main__":
-    raise SystemExit(main())
\ No newline at end of file
+    raise SystemExit(main())